@@ -3,6 +3,11 @@ import os
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from app.cache import content_cache
+from app.page_cache import page_cache
+from app.image_cache import image_cache
+from app.assets import assets
+from app.compression import compression
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -17,6 +22,11 @@ def create_app(config_class=Config):
 
     db.init_app(app)
     migrate.init_app(app, db)
+    content_cache.init_app(app)
+    page_cache.init_app(app)
+    image_cache.init_app(app)
+    assets.init_app(app)
+    compression.init_app(app)
 
     from app.routes import main
     from app.admin_routes import admin_bp
@@ -27,4 +37,12 @@ def create_app(config_class=Config):
     from app.utils import get_video_embed_url
     app.jinja_env.filters['youtube_embed'] = get_video_embed_url
 
+    from app.images import image_attrs, image_video
+    app.jinja_env.globals['image_attrs'] = image_attrs
+    app.jinja_env.globals['image_video'] = image_video
+
+    from app.commands import images_cli, assets_cli
+    app.cli.add_command(images_cli)
+    app.cli.add_command(assets_cli)
+
     return app
@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, session, request, abort
-from app.models import User, Page, Section, Program, TeamMember, Partnership, NewsArticle, Testimonial, ImpactMetric, ContactInfo, SocialMedia, ContentItem, SiteSettings, Sponsor, ProgramSubContent, SponsorshipTier, GalleryItem, Inquiry
-from app.forms import LoginForm, PageForm, SectionForm, ItemForm, ImpactMetricForm, SiteSettingsForm, SponsorForm, ContactInfoForm, SocialMediaForm, ProgramForm, ProgramSubContentForm, PartnershipForm, SponsorshipTierForm, TeamMemberForm, NewsArticleForm, TestimonialForm, GalleryItemForm
+import zipfile
+from flask import Blueprint, render_template, redirect, url_for, flash, session, request, abort, current_app, jsonify
+from sqlalchemy import func
+from app.models import User, Page, Section, Program, TeamMember, Partnership, NewsArticle, Testimonial, ImpactMetric, ContactInfo, SocialMedia, ContentItem, SiteSettings, Sponsor, ProgramSubContent, SponsorshipTier, GalleryItem, Inquiry, ImageJob
+from app.forms import LoginForm, PageForm, SectionForm, ItemForm, ImpactMetricForm, SiteSettingsForm, SponsorForm, ContactInfoForm, SocialMediaForm, ProgramForm, ProgramSubContentForm, PartnershipForm, SponsorshipTierForm, TeamMemberForm, NewsArticleForm, TestimonialForm, GalleryItemForm, GalleryBulkUploadForm
 from app.utils import save_picture, slugify
+from app.uploads import iter_bulk_images, TooManyFiles, InvalidImage
 from app import db
 from functools import wraps
 
@@ -743,6 +746,75 @@ def create_gallery_item():
         return redirect(url_for('admin.list_gallery'))
     return render_template('admin/gallery_edit.html', form=form, legend="Add Gallery Item")
 
+@admin_bp.route('/gallery/bulk', methods=['GET', 'POST'])
+@login_required
+def bulk_upload_gallery():
+    # The form parser spools every file to disk, so a large request costs disk
+    # rather than memory; only the limits need raising for this view
+    request.max_content_length = current_app.config['GALLERY_BULK_MAX_BYTES']
+    request.max_form_parts = current_app.config['GALLERY_BULK_MAX_FILES'] + 20
+    form = GalleryBulkUploadForm()
+    wants_json = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if form.validate_on_submit():
+        # program_id=0 is "no program"
+        shared = dict(category=form.category.data or 'General', program_id=form.program_id.data or None,
+                      order=form.order.data or 0)
+        uploads = (form.files.data or []) + [form.archive.data]
+        error = None
+        filenames, rejected, jobs = [], [], []
+        try:
+            for image in iter_bulk_images(uploads, current_app.config['GALLERY_BULK_MAX_FILES'],
+                                          current_app.config['MAX_CONTENT_LENGTH']):
+                try:
+                    filenames.append(save_picture(image, folder='gallery', jobs=jobs))
+                except InvalidImage as e:
+                    # Archive members skip the form's header check; leave them out rather than fail the batch
+                    rejected.append(f'{image.filename}: {e}')
+        except zipfile.BadZipFile:
+            error = 'The ZIP archive could not be read.'
+        except TooManyFiles as e:
+            error = f'{e}; please upload them in smaller batches.'
+        else:
+            if not filenames:
+                error = ' '.join(['No images were found in the upload.'] + rejected)
+        if error:
+            db.session.rollback()
+            if wants_json:
+                return jsonify(error=error), 400
+            flash(error, 'danger')
+            return render_template('admin/gallery_bulk.html', form=form)
+
+        # One flush inserts every row, and one commit re-renders the gallery once
+        db.session.add_all([GalleryItem(image_filename=filename, **shared) for filename in filenames])
+        db.session.commit()
+
+        if wants_json:
+            # Processing runs in the image worker; the page polls the queue for the
+            # jobs queued here. Files uploaded before were processed then and have none.
+            return jsonify(created=len(filenames), rejected=rejected, redirect=url_for('admin.list_gallery'),
+                           status=url_for('admin.image_job_status', ids=','.join(str(job.id) for job in jobs))
+                           if jobs else None)
+        flash(f'{len(filenames)} gallery item(s) added; images are being processed.', 'success')
+        for message in rejected:
+            flash(f'Skipped {message}', 'warning')
+        return redirect(url_for('admin.list_gallery'))
+    if wants_json and request.method == 'POST':
+        return jsonify(error=' '.join(e for errors in form.errors.values() for e in errors)), 400
+    return render_template('admin/gallery_bulk.html', form=form)
+
+@admin_bp.route('/images/jobs')
+@login_required
+def image_job_status():
+    """Counts the image jobs with the given comma-separated ids by status, for progress bars."""
+    try:
+        ids = {int(job_id) for job_id in request.args.get('ids', '').split(',')}
+    except ValueError:
+        abort(400)
+    counts = dict(db.session.query(ImageJob.status, func.count()).filter(ImageJob.id.in_(ids))
+                  .group_by(ImageJob.status).all())
+    return jsonify(total=sum(counts.values()), pending=counts.get('pending', 0) + counts.get('running', 0),
+                   **{status: counts.get(status, 0) for status in ('done', 'failed', 'skipped')})
+
 @admin_bp.route('/gallery/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_gallery_item(id):
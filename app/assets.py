@@ -0,0 +1,303 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from flask import request, send_file
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .gz variants are made
+    brotli = None
+
+# One year, for responses whose URL changes whenever their content does
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Hex digits of the content hash put into asset URLs
+FINGERPRINT_LENGTH = 12
+
+# style.<fingerprint>.css -> (style, <fingerprint>, .css)
+_FINGERPRINTED = re.compile(r'^(.+)\.([0-9a-f]{%d})(\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+# Uploads are named after their content (see app.uploads.store_upload)
+_CONTENT_ADDRESSED_UPLOAD = re.compile(r'^uploads/.+/[0-9a-f]{32}\.[^./]+$')
+
+# Text formats worth compressing; images other than SVG are compressed already
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico'}
+
+# Precompressed siblings, best first: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ENCODED_SUFFIXES = tuple(suffix for _, suffix in ENCODINGS)
+
+# Files smaller than this fit in a packet or two either way
+PRECOMPRESS_MIN_SIZE = 1024
+
+# Page stylesheets: every app/styles/<name>.css is minified into
+# static/bundles/<name>.css, a shared core.css plus one per page
+STYLE_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles')
+BUNDLE_DIR = 'bundles'
+
+# Quoted strings are kept verbatim, comments dropped
+_CSS_TOKEN = re.compile(r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|/\*.*?\*/', re.S)
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def immutable_file(path, mimetype=None, vary_accept=False, max_age=None):
+    """
+    Sends a file whose URL changes whenever its content does, cacheable for a
+    year. With max_age (seconds) the file stands in for a better one that is
+    still being made, so it is cacheable for that long only.
+    """
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=max_age or IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    if not max_age:
+        response.cache_control.immutable = True
+    if vary_accept:
+        response.vary.add('Accept')
+    return response
+
+
+def is_compressible(filename):
+    return os.path.splitext(filename)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def precompress(folder, min_size=PRECOMPRESS_MIN_SIZE):
+    """
+    Writes .br and .gz siblings of every compressible file under folder at the
+    highest levels, once, so requests never pay for compression. Siblings that
+    are up to date are left alone, and ones that wouldn't save at least a tenth
+    are not written (or removed). Returns the number of files written.
+    """
+    encodings = [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != 'br' or brotli]
+    written = 0
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            if not is_compressible(name) or os.path.getsize(path) < min_size:
+                continue
+            mtime = os.path.getmtime(path)
+            data = None
+            for encoding, suffix in encodings:
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = _compress(data, encoding)
+                if len(compressed) > len(data) * 0.9:
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(target + '.tmp', target)
+                written += 1
+    return written
+
+
+def precompressed_variant(path, accept_encodings):
+    """
+    Returns (path, Content-Encoding) of the best up-to-date precompressed sibling
+    of path the client accepts, or (path, None).
+    """
+    mtime = None
+    for encoding, suffix in ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+        try:
+            encoded_mtime = os.path.getmtime(path + suffix)
+        except FileNotFoundError:
+            continue
+        if mtime is None:
+            mtime = os.path.getmtime(path)
+        # A sibling older than the file is left over from before a deploy
+        if encoded_mtime >= mtime:
+            return path + suffix, encoding
+    return path, None
+
+
+def minify_css(css):
+    """Strips comments and the whitespace CSS doesn't need; quoted strings are left alone."""
+    out = []
+    text = []
+
+    def flush():
+        part = re.sub(r'\s+', ' ', ' '.join(text))
+        part = _CSS_PUNCTUATION.sub(r'\1', part)
+        out.append(re.sub(r':\s+', ':', part))
+        text.clear()
+
+    for i, part in enumerate(_CSS_TOKEN.split(css)):
+        if i % 2 == 0:
+            text.append(part)
+        elif part is not None:
+            flush()
+            out.append(part)
+    flush()
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def write_bundle(source, target):
+    """Minifies source into target, leaving target untouched if it's up to date. Returns True if written."""
+    with open(source, encoding='utf-8') as f:
+        data = minify_css(f.read()).encode('utf-8')
+    try:
+        with open(target, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    # Several workers may start at once; each writes its own file and renames
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    # mkstemp creates the file private; the web server may serve it directly
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, target)
+    return True
+
+
+def build_bundles(source_dir, output_dir):
+    """Writes a minified copy of every stylesheet in source_dir to output_dir. Returns the names written."""
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for name in sorted(os.listdir(source_dir)):
+        if name.endswith('.css') and write_bundle(os.path.join(source_dir, name), os.path.join(output_dir, name)):
+            written.append(name)
+    return written
+
+
+def fingerprint_filename(filename, fingerprint):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{fingerprint}{ext}"
+
+
+class AssetManifest:
+    """
+    Content hashes of the files under the static folder (uploads excepted),
+    taken at startup. url_for('static', filename=...) emits the fingerprinted
+    name of any file in the manifest, e.g. style.3f2a1b9c0d4e.css, and the
+    static view serves those names as immutable for a year, so a deploy that
+    changes a file changes its URL instead of leaving stale copies in caches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self.static_folder = None
+        self.auto_reload = False
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+        self.static_folder = app.static_folder
+        # Pick up edited files without a restart while developing
+        self.auto_reload = app.debug
+        try:
+            build_bundles(STYLE_SOURCE_DIR, os.path.join(self.static_folder, BUNDLE_DIR))
+        except OSError as e:
+            # A read-only deploy keeps serving the bundles it was shipped with
+            app.logger.warning("Could not build stylesheet bundles: %s", e)
+        self.build(exclude=(os.path.basename(app.config['UPLOAD_FOLDER']),))
+        if app.config.get('ASSET_FINGERPRINTS', True):
+            app.url_defaults(self._fingerprint_url)
+        app.view_functions['static'] = self.send_static_file
+
+    def build(self, exclude=()):
+        """Hashes every static file outside the excluded top-level directories."""
+        hashes = {}
+        for root, dirs, names in os.walk(self.static_folder):
+            if root == self.static_folder:
+                dirs[:] = [d for d in dirs if d not in exclude]
+            for name in names:
+                if name.endswith(ENCODED_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                hashes[filename] = self._hash(path)
+        with self._lock:
+            self._hashes = hashes
+
+    @staticmethod
+    def _hash(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return os.path.getmtime(path), digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+    def fingerprint(self, filename):
+        """Returns the current content hash of a static file, or None if it isn't in the manifest."""
+        entry = self._hashes.get(filename)
+        if entry is None:
+            return None
+        if self.auto_reload:
+            path = os.path.join(self.static_folder, filename)
+            try:
+                if filename.startswith(BUNDLE_DIR + '/'):
+                    source = os.path.join(STYLE_SOURCE_DIR, filename[len(BUNDLE_DIR) + 1:])
+                    if os.path.getmtime(source) > os.path.getmtime(path):
+                        write_bundle(source, path)
+                if os.path.getmtime(path) != entry[0]:
+                    entry = self._hashes[filename] = self._hash(path)
+            except FileNotFoundError:
+                return None
+        return entry[1]
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        fingerprint = self.fingerprint(values['filename'])
+        if fingerprint:
+            values['filename'] = fingerprint_filename(values['filename'], fingerprint)
+
+    def resolve(self, filename):
+        """
+        Returns (filename on disk, immutable) for a requested static filename.
+        Fingerprinted names are only immutable while the fingerprint is current;
+        a stale one (a page cached from before a deploy) gets the current file.
+        """
+        match = _FINGERPRINTED.match(filename)
+        if match:
+            original = match.group(1) + match.group(3)
+            fingerprint = self.fingerprint(original)
+            if fingerprint:
+                return original, fingerprint == match.group(2)
+        return filename, bool(_CONTENT_ADDRESSED_UPLOAD.match(filename))
+
+    def send_static_file(self, filename):
+        """
+        The static view: resolves fingerprints and sends the best precompressed
+        variant the client accepts. send_file hands the path to the server's
+        file wrapper, so the bytes are sent with sendfile where supported.
+        """
+        filename, immutable = self.resolve(filename)
+        path = safe_join(self.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        if not is_compressible(filename):
+            return immutable_file(path) if immutable else send_file(path, conditional=True)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        variant, encoding = precompressed_variant(path, request.accept_encodings)
+        if immutable:
+            response = immutable_file(variant, mimetype)
+        else:
+            response = send_file(variant, mimetype=mimetype, conditional=True)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+assets = AssetManifest()
@@ -0,0 +1,214 @@
+import threading
+import time
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+
+# Writes to these tables never show up on public pages, so they don't bump
+# the shared content version.
+UNVERSIONED_TABLES = {'user', 'inquiry', 'content_version', 'image_job', 'stored_upload'}
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key: one thread runs the
+    function while the others wait for its result instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """
+        Returns (result, shared); shared is True when the result came from
+        another thread's call. Waiters that time out, or whose leader raised,
+        fall back to calling fn() themselves.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout) and call.error is None:
+                return call.result, True
+            return fn(), False
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class ContentCache:
+    """
+    Process-level cache for data rendered on public pages.
+    Every entry declares the tables it was built from and is dropped
+    as soon as a commit writes to one of those tables.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self._listeners = []
+        self._flight = SingleFlight()
+        self.flight_timeout = None
+        self.version = None
+        self.updated_at = None
+        self._version_checked_at = None
+
+    def init_app(self, app):
+        app.extensions['content_cache'] = self
+        self.flight_timeout = app.config.get('SINGLE_FLIGHT_TIMEOUT', 10)
+        self.clear()
+        self.version = None
+        self.updated_at = None
+        self._version_checked_at = None
+        app.before_request(self.sync_version)
+
+    def add_listener(self, listener):
+        """Registers listener(tables) to be called on every invalidation; tables is None for a full clear."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def get_or_set(self, key, factory, tables):
+        """
+        Returns the cached value for key, building it with factory() on a miss.
+        Concurrent misses for the same key share a single factory() call.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0]
+
+        def build():
+            generation = self._generation
+            value = factory()
+            with self._lock:
+                # Don't store a value that an invalidation overtook while it was being built
+                if generation == self._generation:
+                    self._entries[key] = (value, frozenset(tables))
+            return value
+
+        value, _ = self._flight.do(key, build, self.flight_timeout)
+        return value
+
+    def invalidate(self, tables):
+        """Drops every entry built from any of the given table names."""
+        tables = set(tables)
+        with self._lock:
+            self._generation += 1
+            for key in [k for k, (_, deps) in self._entries.items() if deps & tables]:
+                del self._entries[key]
+        for listener in self._listeners:
+            listener(tables)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        for listener in self._listeners:
+            listener(None)
+
+    def sync_version(self):
+        """
+        Compares the persisted content version with the one this worker last saw,
+        at most once per CONTENT_VERSION_CHECK_INTERVAL seconds, and drops every
+        entry when another worker has committed content since.
+        """
+        interval = current_app.config.get('CONTENT_VERSION_CHECK_INTERVAL', 2)
+        now = time.monotonic()
+        if self._version_checked_at is not None and now - self._version_checked_at < interval:
+            return
+        self._version_checked_at = now
+
+        version, updated_at = read_content_version()
+        if version != self.version:
+            self.clear()
+            self.version = version
+            self.updated_at = updated_at
+
+    def committed_version(self, version, updated_at=None):
+        """Records a version this worker committed itself, unless it skipped someone else's."""
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+            self.updated_at = updated_at
+
+
+def read_content_version():
+    """Returns (version, time it was last bumped), or (None, None) before the first content commit."""
+    from app import db
+    from app.models import ContentVersion
+    row = db.session.execute(
+        select(ContentVersion.version, ContentVersion.updated_at).where(ContentVersion.id == 1)
+    ).first()
+    return tuple(row) if row else (None, None)
+
+
+def bump_content_version(session):
+    """Increments the shared content version inside the session's transaction and returns (version, updated_at)."""
+    from app.models import ContentVersion
+    result = session.execute(
+        update(ContentVersion).where(ContentVersion.id == 1).values(version=ContentVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        session.execute(insert(ContentVersion).values(id=1, version=1))
+    return tuple(session.execute(
+        select(ContentVersion.version, ContentVersion.updated_at).where(ContentVersion.id == 1)
+    ).first())
+
+
+content_cache = ContentCache()
+
+
+# --- Session events ---
+# Changed tables are collected on every flush and only acted upon once the
+# transaction commits, so rolled back writes never invalidate anything.
+
+@event.listens_for(Session, 'after_flush')
+def _record_changed_tables(session, flush_context):
+    changed = session.info.setdefault('changed_tables', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        changed.add(obj.__table__.name)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_version_for_changed_tables(session):
+    session.flush()
+    if session.info.get('changed_tables', set()) - UNVERSIONED_TABLES:
+        session.info['content_version'] = bump_content_version(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_tables(session):
+    changed = session.info.pop('changed_tables', None)
+    version = session.info.pop('content_version', None)
+    if changed:
+        content_cache.invalidate(changed)
+    if version is not None:
+        # This worker already dropped exactly what it changed
+        content_cache.committed_version(*version)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
+    session.info.pop('content_version', None)
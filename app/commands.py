@@ -0,0 +1,64 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.image_jobs import work, queue_missing_images
+from app.uploads import find_orphaned_uploads, remove_orphaned_uploads
+from app.assets import precompress, brotli
+
+images_cli = AppGroup('images', help='Process uploaded images.')
+assets_cli = AppGroup('assets', help='Prepare static files for serving.')
+
+
+@images_cli.command('worker')
+@click.option('--processes', type=int, default=None,
+              help='Worker processes for Pillow jobs (default: IMAGE_WORKER_PROCESSES or every core).')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty instead of polling for new jobs.')
+def worker(processes, once):
+    """Process queued uploads: responsive derivatives and AVIF/WebP encodings."""
+    work(processes=processes or current_app.config.get('IMAGE_WORKER_PROCESSES'),
+         poll_interval=current_app.config.get('IMAGE_WORKER_POLL_INTERVAL', 2), once=once)
+
+
+@images_cli.command('backfill')
+@click.option('--reprocess', is_flag=True, help='Queue uploads that were already processed too.')
+def backfill(reprocess):
+    """Queue every referenced upload that has not been processed yet."""
+    click.echo(f"Queued {queue_missing_images(reprocess)} image(s).")
+
+
+@images_cli.command('gc')
+@click.option('--delete', is_flag=True, help='Remove the files found instead of only listing them.')
+@click.option('--grace', type=int, default=None,
+              help='Skip files modified within this many seconds (default: UPLOAD_GC_GRACE_PERIOD).')
+@click.option('--every', type=int, default=None, metavar='SECONDS',
+              help='Keep running and collect again every SECONDS.')
+def gc(delete, grace, every):
+    """Report (or with --delete, remove) uploads and derivatives that no row references."""
+    if grace is None:
+        grace = current_app.config.get('UPLOAD_GC_GRACE_PERIOD', 3600)
+    while True:
+        orphans = find_orphaned_uploads(grace)
+        for path, size in orphans:
+            click.echo(f"{path}\t{size}")
+        total = sum(size for _, size in orphans)
+        if delete:
+            freed = remove_orphaned_uploads(orphans)
+            click.echo(f"Removed {len(orphans)} unreferenced file(s), {freed} bytes.")
+        else:
+            click.echo(f"Found {len(orphans)} unreferenced file(s), {total} bytes. Run with --delete to remove them.")
+        if every is None:
+            return
+        db.session.remove()
+        time.sleep(every)
+
+
+@assets_cli.command('precompress')
+@click.option('--min-size', type=int, default=1024, help='Skip files smaller than this many bytes.')
+def precompress_assets(min_size):
+    """Write .br/.gz variants of static files and text uploads (CSS, JS, SVG) for the static view."""
+    if brotli is None:
+        click.echo("The brotli module is not installed; writing .gz variants only.")
+    written = precompress(current_app.static_folder, min_size)
+    click.echo(f"Wrote {written} compressed file(s).")
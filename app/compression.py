@@ -0,0 +1,174 @@
+import gzip
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_options_header, parse_set_header
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzipped
+    brotli = None
+
+# Statuses that never carry a body worth compressing
+_NO_BODY_STATUSES = {204, 206, 304}
+
+
+class ResponseCompression:
+    """
+    WSGI middleware that compresses HTML and JSON responses of at least
+    COMPRESS_MIN_SIZE bytes for clients that accept it, brotli first, then
+    gzip. The levels are low enough to cost about a millisecond per page;
+    static files are compressed at the highest levels ahead of time instead
+    (flask assets precompress). Responses that are already encoded, streamed
+    (no Content-Length), marked no-transform or HEAD requests pass through.
+    The page cache compresses its pages once, when they are stored, and
+    replays the encoded bytes (see app.page_cache.CachedPage).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 1024
+        self.gzip_level = 5
+        self.brotli_quality = 4
+        self.mimetypes = frozenset()
+
+    def init_app(self, app):
+        app.extensions['compression'] = self
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 5)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+        self.mimetypes = frozenset(app.config.get('COMPRESS_MIMETYPES', ('text/html', 'application/json')))
+        if self.enabled:
+            app.wsgi_app = _CompressionMiddleware(app.wsgi_app, self)
+
+    @property
+    def encodings(self):
+        """Content-Encodings this process can produce, best first."""
+        return ('br', 'gzip') if brotli else ('gzip',)
+
+    def applies_to(self, mimetype, size):
+        return self.enabled and mimetype in self.mimetypes and size >= self.min_size
+
+    def negotiate(self, accept_encodings):
+        """Returns the best encoding the client accepts, or None."""
+        for encoding in self.encodings:
+            if accept_encodings[encoding]:
+                return encoding
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def encode_all(self, data, mimetype):
+        """
+        Returns {encoding: compressed bytes} of data for every encoding, or {}
+        when it isn't worth compressing; for bodies that are replayed many times.
+        """
+        if not self.applies_to(mimetype, len(data)):
+            return {}
+        encoded = {}
+        for encoding in self.encodings:
+            compressed = self.compress(data, encoding)
+            if len(compressed) < len(data):
+                encoded[encoding] = compressed
+        return encoded
+
+
+def add_vary(headers, name):
+    vary = parse_set_header(headers.get('Vary'))
+    if name not in vary:
+        vary.add(name)
+        headers['Vary'] = vary.to_header()
+
+
+def weaken_etag(headers):
+    # The encoded body differs byte for byte, so a strong validator no longer fits it
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = 'W/' + etag
+
+
+class _CompressionMiddleware:
+
+    def __init__(self, wsgi_app, compression):
+        self.wsgi_app = wsgi_app
+        self.compression = compression
+
+    def __call__(self, environ, start_response):
+        started = []
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            started[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.wsgi_app(environ, capture)
+        # Flask calls start_response before returning its body iterable
+        status, header_list, exc_info = started
+        headers = Headers(header_list)
+
+        if not self._eligible(int(status.split(None, 1)[0]), headers):
+            start_response(status, header_list, exc_info)
+            return _prepend(written, app_iter)
+
+        add_vary(headers, 'Accept-Encoding')
+        encoding = self.compression.negotiate(parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING')))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return _prepend(written, app_iter)
+
+        try:
+            body = b''.join(written) + b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        compressed = self.compression.compress(body, encoding)
+        if len(compressed) < len(body):
+            body = compressed
+            headers['Content-Encoding'] = encoding
+            headers['Content-Length'] = str(len(body))
+            weaken_etag(headers)
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return [body]
+
+    def _eligible(self, status_code, headers):
+        if status_code < 200 or status_code in _NO_BODY_STATUSES:
+            return False
+        # Already encoded, e.g. a precompressed static file or a cached page
+        if headers.get('Content-Encoding', 'identity') != 'identity':
+            return False
+        # Streamed bodies have no length and must not be buffered
+        length = headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        mimetype = parse_options_header(headers.get('Content-Type', ''))[0]
+        return self.compression.applies_to(mimetype, int(length))
+
+
+def _prepend(written, app_iter):
+    # Leave the iterable untouched when possible, so file wrappers keep working
+    if not written:
+        return app_iter
+    return _ChainedBody(written, app_iter)
+
+
+class _ChainedBody:
+    """Data passed to the write() callable followed by the body, closing the body."""
+
+    def __init__(self, written, app_iter):
+        self.written = written
+        self.app_iter = app_iter
+
+    def __iter__(self):
+        yield from self.written
+        yield from self.app_iter
+
+    def close(self):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+
+
+compression = ResponseCompression()
@@ -0,0 +1,446 @@
+import calendar
+from bisect import bisect_right
+from datetime import date, timedelta
+from types import MappingProxyType
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload, joinedload
+from app import db
+from app.cache import content_cache
+from app.models import Page, Section, ContentItem, Program, ProgramSubContent, TeamMember, Partnership, SponsorshipTier, NewsArticle, Testimonial, ImpactMetric, ContactInfo, InquiryType, GalleryItem
+
+# Tables the public pages are rendered from; a commit touching any of them
+# replaces the snapshot.
+CONTENT_MODELS = (Page, Section, ContentItem, Program, ProgramSubContent, TeamMember, Partnership,
+                  SponsorshipTier, NewsArticle, Testimonial, ImpactMetric, ContactInfo, InquiryType, GalleryItem)
+CONTENT_TABLES = tuple(model.__tablename__ for model in CONTENT_MODELS)
+
+
+class Record:
+    """
+    Read-only copy of a model row that lives outside any session.
+    Column values and loaded relationships are plain attributes; the model's
+    own properties (detail_url, benefits_list, ...) are evaluated against the copy.
+    """
+    __slots__ = ('_model', '_values')
+
+    def __init__(self, model, values):
+        object.__setattr__(self, '_model', model)
+        object.__setattr__(self, '_values', values)
+
+    def __getattr__(self, name):
+        if name in Record.__slots__:
+            raise AttributeError(name)
+        values = self._values
+        if name in values:
+            return values[name]
+        attr = getattr(self._model, name, None)
+        if isinstance(attr, property):
+            return attr.fget(self)
+        raise AttributeError(f"{self._model.__name__} record has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self._model.__name__} records are read-only")
+
+    def __repr__(self):
+        return f"<{self._model.__name__} record {self._values.get('id')}>"
+
+    def _freeze(self):
+        object.__setattr__(self, '_values', MappingProxyType(self._values))
+
+
+def _copy_rows(model, *order_by):
+    """Loads every row of model and returns (records, records_by_id)."""
+    columns = [attr.key for attr in model.__mapper__.column_attrs]
+    rows = db.session.query(*[getattr(model, c) for c in columns]).order_by(*order_by).all()
+    records = [Record(model, dict(zip(columns, row))) for row in rows]
+    return records, {r.id: r for r in records}
+
+
+def _group(records, key):
+    groups = {}
+    for record in records:
+        groups.setdefault(getattr(record, key), []).append(record)
+    return groups
+
+
+def _by_order(records):
+    return sorted(records, key=lambda r: (r.order or 0, r.id))
+
+
+# --- News ordering ---
+# Articles are listed newest first by (date_published, id), undated ones last.
+# A cursor names the last article already shown, so the next page is a range
+# read on ix_news_article_date_published_id however deep the reader scrolls.
+
+def encode_news_cursor(article):
+    published = article.date_published.isoformat() if article.date_published else ''
+    return f"{published}_{article.id}"
+
+
+def decode_news_cursor(cursor):
+    """Returns (date_published, id) for a cursor string; raises ValueError if it is malformed."""
+    published, sep, article_id = cursor.partition('_')
+    if not sep:
+        raise ValueError(f"Invalid news cursor: {cursor!r}")
+    return (date.fromisoformat(published) if published else None), int(article_id)
+
+
+def _news_key(published, article_id):
+    return (published is None, -(published.toordinal() if published else 0), -article_id)
+
+
+def _archive_range(year, month=None):
+    """Returns the [start, end) dates of a year or month archive."""
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]) + timedelta(days=1)
+
+
+def _archive_month(year, month, count):
+    return {'year': year, 'month': month, 'count': count, 'label': f"{calendar.month_name[month]} {year}"}
+
+
+# --- Gallery ordering ---
+# Gallery items are listed by (order, id); cursors work like the news ones.
+
+def encode_gallery_cursor(item):
+    return f"{item.order or 0}_{item.id}"
+
+
+def decode_gallery_cursor(cursor):
+    """Returns (order, id) for a cursor string; raises ValueError if it is malformed."""
+    order, sep, item_id = cursor.partition('_')
+    if not sep:
+        raise ValueError(f"Invalid gallery cursor: {cursor!r}")
+    return int(order), int(item_id)
+
+
+def _gallery_key(item):
+    return (item.order or 0, item.id)
+
+
+def _matches_media(item, media):
+    return media is None or (media == 'video') == bool(item.video_url)
+
+
+class ContentSnapshot:
+    """
+    Immutable copy of all public CMS content, loaded with one query per table.
+    Exposes the same read methods as LiveContent.
+    """
+
+    def __init__(self):
+        pages, _ = _copy_rows(Page, Page.id)
+        sections, _ = _copy_rows(Section, Section.id)
+        items, _ = _copy_rows(ContentItem, ContentItem.id)
+        programs, programs_by_id = _copy_rows(Program, Program.id)
+        subcontents, _ = _copy_rows(ProgramSubContent, ProgramSubContent.id)
+        gallery, _ = _copy_rows(GalleryItem, GalleryItem.id)
+        partnerships, _ = _copy_rows(Partnership, Partnership.id)
+        tiers, _ = _copy_rows(SponsorshipTier, SponsorshipTier.id)
+        news, news_by_id = _copy_rows(NewsArticle, NewsArticle.id)
+        team, _ = _copy_rows(TeamMember, TeamMember.id)
+        testimonials, _ = _copy_rows(Testimonial, Testimonial.id)
+        metrics, _ = _copy_rows(ImpactMetric, ImpactMetric.id)
+        contact_info, _ = _copy_rows(ContactInfo, ContactInfo.id)
+        inquiry_types, _ = _copy_rows(InquiryType, InquiryType.id)
+
+        # Wire up the relationships the templates walk
+        items_by_section = _group(items, 'section_id')
+        for section in sections:
+            section._values['items_list'] = tuple(_by_order(items_by_section.get(section.id, [])))
+        sections_by_page = _group(sections, 'page_id')
+        for page in pages:
+            page._values['sections_list'] = tuple(_by_order(sections_by_page.get(page.id, [])))
+        subcontents_by_program = _group(subcontents, 'program_id')
+        gallery_by_program = _group(gallery, 'program_id')
+        for program in programs:
+            program._values['subcontents_list'] = tuple(_by_order(subcontents_by_program.get(program.id, [])))
+            program._values['gallery_items_list'] = tuple(_by_order(gallery_by_program.get(program.id, [])))
+        for sub in subcontents:
+            sub._values['program'] = programs_by_id.get(sub.program_id)
+        for item in gallery:
+            item._values['program'] = programs_by_id.get(item.program_id)
+        tiers_by_partnership = _group(tiers, 'partnership_id')
+        for partner in partnerships:
+            partner._values['tiers_list'] = tuple(_by_order(tiers_by_partnership.get(partner.id, [])))
+
+        for record in (pages + sections + items + programs + subcontents + gallery + partnerships + tiers +
+                       news + team + testimonials + metrics + contact_info + inquiry_types):
+            record._freeze()
+
+        self._pages = MappingProxyType({
+            page.slug: (page, MappingProxyType({s.section_key: s for s in page.sections_list}))
+            for page in pages
+        })
+        self._programs = tuple(_by_order(programs))
+        self._programs_by_slug = MappingProxyType({p.slug: p for p in programs})
+        self._programs_by_id = MappingProxyType(programs_by_id)
+        self._gallery = tuple(_by_order(gallery))
+        self._gallery_by_category = MappingProxyType({
+            category: tuple(_by_order(items)) for category, items in _group(gallery, 'category').items()
+        })
+        self._gallery_programs = tuple(p for p in programs if p.gallery_items_list)
+        self._partnerships = tuple(partnerships)
+        self._news = tuple(sorted(news, key=lambda a: _news_key(a.date_published, a.id)))
+        self._news_keys = [_news_key(a.date_published, a.id) for a in self._news]
+        self._news_by_id = MappingProxyType(news_by_id)
+        self._team = tuple(team)
+        self._testimonials = tuple(testimonials)
+        self._metrics = tuple(metrics)
+        self._contact_info = contact_info[0] if contact_info else None
+        self._inquiry_types = tuple(inquiry_types)
+
+    def page_data(self, slug):
+        return self._pages.get(slug, (None, MappingProxyType({})))
+
+    def featured_programs(self):
+        return [p for p in self._programs if p.is_featured]
+
+    def programs(self):
+        return list(self._programs)
+
+    def program_by_slug(self, slug):
+        return self._programs_by_slug.get(slug)
+
+    def subcontents_by_program(self, programs):
+        return {p.id: p.subcontents_list for p in programs}
+
+    def related_programs(self, program, limit=3):
+        return [p for p in self._programs if p.type == program.type and p.id != program.id][:limit]
+
+    def program_gallery(self, program):
+        return list(program.gallery_items_list)
+
+    def gallery_items(self, limit=None):
+        return list(self._gallery[:limit])
+
+    def gallery_page(self, cursor=None, limit=12, program_id=None, category=None, media=None):
+        """
+        Returns (items, next_cursor) for the gallery items after cursor, optionally
+        filtered by program, category and media ('image' or 'video').
+        """
+        if program_id is not None:
+            program = self._programs_by_id.get(program_id)
+            candidates = program.gallery_items_list if program else ()
+        elif category is not None:
+            candidates = self._gallery_by_category.get(category, ())
+        else:
+            candidates = self._gallery
+        start = bisect_right(candidates, cursor, key=_gallery_key) if cursor else 0
+
+        items = []
+        for item in candidates[start:]:
+            if (category is None or item.category == category) and _matches_media(item, media):
+                items.append(item)
+                if len(items) > limit:
+                    break
+        has_more = len(items) > limit
+        items = items[:limit]
+        return items, (encode_gallery_cursor(items[-1]) if has_more else None)
+
+    def gallery_programs(self):
+        return list(self._gallery_programs)
+
+    def gallery_categories(self):
+        return sorted(c for c in self._gallery_by_category if c)
+
+    def partnerships(self):
+        return list(self._partnerships)
+
+    def team_members(self):
+        return list(self._team)
+
+    def news_page(self, cursor=None, limit=9):
+        """Returns (articles, next_cursor) for the page after cursor; next_cursor is None on the last page."""
+        start = bisect_right(self._news_keys, _news_key(*cursor)) if cursor else 0
+        articles = list(self._news[start:start + limit])
+        has_more = start + limit < len(self._news)
+        return articles, (encode_news_cursor(articles[-1]) if has_more and articles else None)
+
+    def news_archive(self, year, month=None):
+        start, end = _archive_range(year, month)
+        return [a for a in self._news if a.date_published and start <= a.date_published < end]
+
+    def news_archive_months(self):
+        counts = {}
+        for article in self._news:
+            if article.date_published:
+                key = (article.date_published.year, article.date_published.month)
+                counts[key] = counts.get(key, 0) + 1
+        return [_archive_month(year, month, count) for (year, month), count in sorted(counts.items(), reverse=True)]
+
+    def news_article(self, article_id):
+        return self._news_by_id.get(article_id)
+
+    def recent_articles(self, article, limit=3):
+        return [a for a in self._news if a.id != article.id][:limit]
+
+    def news_categories(self):
+        counts = {}
+        for article in self._news:
+            if article.category:
+                counts[article.category] = counts.get(article.category, 0) + 1
+        return [{'name': name, 'count': count} for name, count in sorted(counts.items())]
+
+    def impact_metrics(self):
+        return list(self._metrics)
+
+    def testimonials(self):
+        return list(self._testimonials)
+
+    def contact_info(self):
+        return self._contact_info
+
+    def inquiry_types(self):
+        return list(self._inquiry_types)
+
+
+class LiveContent:
+    """Reads public content straight from the database on every call."""
+
+    def page_data(self, slug):
+        page = Page.query.options(selectinload(Page.sections_list)).filter_by(slug=slug).first()
+        sections = {}
+        if page:
+            for section in page.sections_list:
+                sections[section.section_key] = section
+        return page, sections
+
+    def featured_programs(self):
+        return Program.query.filter_by(is_featured=True).order_by(Program.order.asc()).all()
+
+    def programs(self):
+        return Program.query.order_by(Program.order.asc()).all()
+
+    def program_by_slug(self, slug):
+        return Program.query.options(
+            selectinload(Program.subcontents_list),
+            selectinload(Program.gallery_items_list)
+        ).filter_by(slug=slug).first()
+
+    def subcontents_by_program(self, programs):
+        """Loads the subcontents of all given programs in one query, grouped by program id."""
+        grouped = {}
+        program_ids = [p.id for p in programs]
+        if program_ids:
+            subcontents = ProgramSubContent.query.filter(ProgramSubContent.program_id.in_(program_ids)) \
+                .order_by(ProgramSubContent.program_id, ProgramSubContent.order.asc()).all()
+            for sub in subcontents:
+                grouped.setdefault(sub.program_id, []).append(sub)
+        return grouped
+
+    def related_programs(self, program, limit=3):
+        return Program.query.filter(
+            Program.type == program.type,
+            Program.id != program.id
+        ).limit(limit).all()
+
+    def program_gallery(self, program):
+        return program.gallery_items_list
+
+    def gallery_items(self, limit=None):
+        return GalleryItem.query.options(joinedload(GalleryItem.program)).order_by(GalleryItem.order.asc()).limit(limit).all()
+
+    def gallery_page(self, cursor=None, limit=12, program_id=None, category=None, media=None):
+        """
+        Returns (items, next_cursor) for the gallery items after cursor, optionally
+        filtered by program, category and media ('image' or 'video').
+        """
+        query = GalleryItem.query.options(joinedload(GalleryItem.program))
+        if program_id is not None:
+            query = query.filter(GalleryItem.program_id == program_id)
+        if category is not None:
+            query = query.filter(GalleryItem.category == category)
+        if media == 'video':
+            query = query.filter(GalleryItem.video_url.isnot(None), GalleryItem.video_url != '')
+        elif media == 'image':
+            query = query.filter(or_(GalleryItem.video_url.is_(None), GalleryItem.video_url == ''))
+        if cursor:
+            order, item_id = cursor
+            query = query.filter(GalleryItem.order >= order, or_(GalleryItem.order > order, GalleryItem.id > item_id))
+        items = query.order_by(GalleryItem.order.asc(), GalleryItem.id.asc()).limit(limit + 1).all()
+        has_more = len(items) > limit
+        items = items[:limit]
+        return items, (encode_gallery_cursor(items[-1]) if has_more else None)
+
+    def gallery_programs(self):
+        return Program.query.join(GalleryItem).distinct().all()
+
+    def gallery_categories(self):
+        rows = db.session.query(GalleryItem.category).filter(GalleryItem.category.isnot(None)) \
+            .distinct().order_by(GalleryItem.category).all()
+        return [category for category, in rows if category]
+
+    def partnerships(self):
+        return Partnership.query.options(selectinload(Partnership.tiers_list)).all()
+
+    def team_members(self):
+        return TeamMember.query.all()
+
+    def news_page(self, cursor=None, limit=9):
+        """Returns (articles, next_cursor) for the page after cursor; next_cursor is None on the last page."""
+        published, article_id = cursor if cursor else (None, None)
+        articles = []
+        if cursor is None or published is not None:
+            query = NewsArticle.query.filter(NewsArticle.date_published.isnot(None))
+            if cursor:
+                query = query.filter(NewsArticle.date_published <= published, or_(
+                    NewsArticle.date_published < published, NewsArticle.id < article_id))
+            articles = query.order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc()).limit(limit + 1).all()
+        if len(articles) <= limit:
+            # Undated articles come after every dated one
+            query = NewsArticle.query.filter(NewsArticle.date_published.is_(None))
+            if published is None and article_id is not None:
+                query = query.filter(NewsArticle.id < article_id)
+            articles += query.order_by(NewsArticle.id.desc()).limit(limit + 1 - len(articles)).all()
+        has_more = len(articles) > limit
+        articles = articles[:limit]
+        return articles, (encode_news_cursor(articles[-1]) if has_more else None)
+
+    def news_archive(self, year, month=None):
+        start, end = _archive_range(year, month)
+        return NewsArticle.query.filter(NewsArticle.date_published >= start, NewsArticle.date_published < end) \
+            .order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc()).all()
+
+    def news_archive_months(self):
+        year = db.extract('year', NewsArticle.date_published)
+        month = db.extract('month', NewsArticle.date_published)
+        rows = db.session.query(year, month, db.func.count(NewsArticle.id)) \
+            .filter(NewsArticle.date_published.isnot(None)) \
+            .group_by(year, month).order_by(year.desc(), month.desc()).all()
+        return [_archive_month(int(y), int(m), count) for y, m, count in rows]
+
+    def news_article(self, article_id):
+        return db.session.get(NewsArticle, article_id)
+
+    def recent_articles(self, article, limit=3):
+        return NewsArticle.query.filter(NewsArticle.id != article.id) \
+            .order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc()).limit(limit).all()
+
+    def news_categories(self):
+        categories_data = db.session.query(NewsArticle.category, db.func.count(NewsArticle.id)).group_by(NewsArticle.category).all()
+        return [{'name': cat, 'count': count} for cat, count in categories_data if cat]
+
+    def impact_metrics(self):
+        return ImpactMetric.query.all()
+
+    def testimonials(self):
+        return Testimonial.query.all()
+
+    def contact_info(self):
+        return ContactInfo.query.first()
+
+    def inquiry_types(self):
+        return InquiryType.query.all()
+
+
+def get_content():
+    """
+    Returns the content source for the current request: the shared snapshot,
+    or live queries when CONTENT_SNAPSHOT_ENABLED is off.
+    """
+    if not current_app.config.get('CONTENT_SNAPSHOT_ENABLED', True):
+        return LiveContent()
+    return content_cache.get_or_set('content_snapshot', ContentSnapshot, CONTENT_TABLES)
@@ -1,8 +1,25 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, MultipleFileField
 from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SubmitField, SelectField, DateField, IntegerField
 from wtforms.validators import DataRequired, Email, Length, Optional, Regexp, URL
 from wtforms import ValidationError
+from werkzeug.datastructures import FileStorage
+from app.uploads import check_image_header, InvalidImage
+
+class ImageHeader:
+    """
+    Checks uploaded images from their header alone (format, dimensions, pixel
+    count; see check_image_header), so oversized images are refused before
+    they are saved or decoded.
+    """
+    def __call__(self, form, field):
+        files = field.data if isinstance(field.data, list) else [field.data]
+        for f in files:
+            if isinstance(f, FileStorage) and f.filename:
+                try:
+                    check_image_header(f)
+                except InvalidImage as e:
+                    raise ValidationError(str(e))
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -22,7 +39,7 @@ class SectionForm(FlaskForm):
     section_key = StringField('Section Key (e.g. intro, vision)', validators=[DataRequired(), Length(max=64)])
     title = StringField('Title', validators=[Optional(), Length(max=255)])
     content = TextAreaField('Content (HTML Supported)', validators=[Optional()])
-    image_file = FileField('Section Image', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Section Image', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     video_url = StringField('Video URL (YouTube)', validators=[Optional(), Length(max=255)])
     order = StringField('Order', validators=[Optional()]) # Using StringField for simple integer input or IntegerField
     submit = SubmitField('Save Section')
@@ -31,7 +48,7 @@ class ItemForm(FlaskForm):
     title = StringField('Title')
     subtitle = StringField('Subtitle')
     content = TextAreaField('Content')
-    image_file = FileField('Image', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Image', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     icon = StringField('Icon Class (e.g. fas fa-star)', validators=[Length(max=50)])
     link_url = StringField('Link URL')
     link_text = StringField('Link Text')
@@ -67,7 +84,7 @@ class ProgramForm(FlaskForm):
         ('custom_design', 'Custom Design')
     ])
     icon = StringField('Icon Class (e.g. fas fa-star)', validators=[Optional(), Length(max=64)])
-    image = FileField('Program Image/Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!')])
+    image = FileField('Program Image/Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!'), ImageHeader()])
     cta_url = StringField('CTA URL', validators=[Optional(), Length(max=255)], description="External link or internal path (e.g., /contact)")
     cta_text = StringField('CTA Button Text', validators=[Optional(), Length(max=50)], default="Learn More")
     is_featured = BooleanField('Show on Homepage Highlight Section')
@@ -97,7 +114,7 @@ class TeamMemberForm(FlaskForm):
     title = StringField('Title', validators=[Optional(), Length(max=128)])
     bio = TextAreaField('Bio', validators=[Optional()])
     photo_url = StringField('Photo URL (Legacy)', validators=[Optional(), Length(max=255)])
-    image_file = FileField('Upload Photo', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Upload Photo', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     submit = SubmitField('Save Member')
 
 class PartnershipForm(FlaskForm):
@@ -113,7 +130,7 @@ class PartnershipForm(FlaskForm):
     description = TextAreaField('Description', validators=[Optional()])
     benefits = TextAreaField('Benefits (One per line)', validators=[Optional()])
     logo_url = StringField('Logo URL (Legacy)', validators=[Optional(), Length(max=255)])
-    image_file = FileField('Upload Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Upload Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     submit = SubmitField('Save Partnership')
 
 class NewsArticleForm(FlaskForm):
@@ -123,7 +140,7 @@ class NewsArticleForm(FlaskForm):
     content = TextAreaField('Content', validators=[Optional()])
     excerpt = TextAreaField('Excerpt', validators=[Optional()])
     featured_image_url = StringField('Image URL (Legacy)', validators=[Optional(), Length(max=255)])
-    image_file = FileField('Upload Featured Image', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Upload Featured Image', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     submit = SubmitField('Save Article')
 
 class TestimonialForm(FlaskForm):
@@ -131,7 +148,7 @@ class TestimonialForm(FlaskForm):
     author_role = StringField('Role / Title', validators=[Optional(), Length(max=128)])
     content = TextAreaField('Quote', validators=[DataRequired()])
     author_photo_url = StringField('Photo URL (Legacy)', validators=[Optional(), Length(max=255)])
-    image_file = FileField('Upload Photo', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Upload Photo', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     submit = SubmitField('Save Testimonial')
 
 
@@ -163,7 +180,7 @@ class SiteSettingsForm(FlaskForm):
 
 class SponsorForm(FlaskForm):
     name = StringField('Sponsor Name', validators=[DataRequired(), Length(max=128)])
-    logo_file = FileField('Sponsor Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg', 'svg'])])
+    logo_file = FileField('Sponsor Logo', validators=[FileAllowed(['jpg', 'png', 'jpeg', 'svg']), ImageHeader()])
     order = IntegerField('Order', default=0)
     submit = SubmitField('Save Sponsor')
 
@@ -176,7 +193,7 @@ class SponsorshipTierForm(FlaskForm):
 class GalleryItemForm(FlaskForm):
     title = StringField('Caption / Title', validators=[Optional(), Length(max=255)])
     category = StringField('Category (e.g. Event, Competition)', validators=[Optional(), Length(max=64)])
-    image_file = FileField('Upload Image', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    image_file = FileField('Upload Image', validators=[FileAllowed(['jpg', 'png', 'jpeg']), ImageHeader()])
     video_url = StringField('Video URL (YouTube/Drive)', validators=[Optional(), Length(max=255)])
     program_id = SelectField('Link to Program', coerce=int, validators=[Optional()])
     order = IntegerField('Display Order', default=0)
@@ -187,3 +204,20 @@ class GalleryItemForm(FlaskForm):
         from app.models import Program
         self.program_id.choices = [(0, '--- No Program ---')] + [(p.id, p.name) for p in Program.query.order_by(Program.name).all()]
 
+
+class GalleryBulkUploadForm(FlaskForm):
+    files = MultipleFileField('Images', validators=[FileAllowed(['jpg', 'png', 'jpeg', 'gif', 'webp']), ImageHeader()])
+    archive = FileField('Or a ZIP archive of images', validators=[FileAllowed(['zip'])])
+    category = StringField('Category (e.g. Event, Competition)', validators=[Optional(), Length(max=64)])
+    program_id = SelectField('Link to Program', coerce=int, validators=[Optional()])
+    order = IntegerField('Display Order', default=0)
+    submit = SubmitField('Upload Images')
+
+    def __init__(self, *args, **kwargs):
+        super(GalleryBulkUploadForm, self).__init__(*args, **kwargs)
+        from app.models import Program
+        self.program_id.choices = [(0, '--- No Program ---')] + [(p.id, p.name) for p in Program.query.order_by(Program.name).all()]
+
+    def validate_archive(self, field):
+        if not field.data and not any(f and f.filename for f in self.files.data or []):
+            raise ValidationError('Choose some images or a ZIP archive.')
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import tempfile
+from app.cache import SingleFlight
+
+
+class ImageCache:
+    """
+    On-disk cache of resized images, bounded by total size. Hits refresh the
+    file's mtime, and when the cache grows past IMAGE_CACHE_MAX_BYTES the least
+    recently used files are deleted. Workers share the directory; each keeps
+    its own running total and re-scans the directory before evicting.
+    """
+
+    # Don't rewrite a hit file's mtime more often than this (seconds)
+    TOUCH_INTERVAL = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.flight_timeout = None
+        self.directory = None
+        self.max_bytes = 0
+        self._size = None
+
+    def init_app(self, app):
+        app.extensions['image_cache'] = self
+        self.directory = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'image_cache')
+        self.max_bytes = app.config.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        self.flight_timeout = app.config.get('SINGLE_FLIGHT_TIMEOUT', 10)
+        self._size = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Returns the cached file's path, or None on a miss."""
+        path = self.path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - mtime > self.TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted by another worker in the meantime
+                return None
+        return path
+
+    def get_or_create(self, key, write):
+        """
+        Returns the path of the cached file for key, calling write(path) to
+        create it on a miss. Concurrent misses for the same key share one write.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+        path, _ = self._flight.do(key, lambda: self._create(key, write), self.flight_timeout)
+        return path
+
+    def _create(self, key, write):
+        path = self.get(key)
+        if path is not None:
+            return path
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._added(os.path.getsize(path))
+        return path
+
+    def _added(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """Returns ([(mtime, size, path), ...], total_size) for every file in the cache."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files, sum(size for _, size, _ in files)
+
+    def _evict(self):
+        # Other workers may have added or evicted files since our last scan
+        files, self._size = self._scan()
+        # Drop down to 90% so a full cache doesn't evict on every write
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan()[0]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+
+image_cache = ImageCache()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from PIL import UnidentifiedImageError
+from PIL.Image import DecompressionBombError, DecompressionBombWarning
+from sqlalchemy import update
+from app import db
+from app.images import RESPONSIVE_WIDTHS, UPLOAD_COLUMNS, process_image, record_image, modern_formats
+from app.models import ImageJob, UploadedImage
+
+# A job that fails this many times is left as 'failed' for someone to look at
+MAX_ATTEMPTS = 3
+
+
+def queue_image(folder, filename):
+    """
+    Adds a processing job for an upload to the session. It is committed with the
+    row that references the file, so the worker never sees a job for a save
+    that was rolled back.
+    """
+    job = ImageJob(folder=folder, filename=filename)
+    db.session.add(job)
+    return job
+
+
+def queue_missing_images(reprocess=False):
+    """
+    Queues every referenced upload that has neither a processing record nor a
+    pending job, or with reprocess every one without a pending job (to fill in
+    what newer versions of process_image record). Returns the count.
+    """
+    known = set()
+    if not reprocess:
+        known |= {(r.folder, r.filename) for r in db.session.query(UploadedImage.folder, UploadedImage.filename)}
+    known |= {(j.folder, j.filename) for j in db.session.query(ImageJob.folder, ImageJob.filename)
+              .filter(ImageJob.status.in_(('pending', 'running')))}
+    queued = 0
+    for column, folder in UPLOAD_COLUMNS:
+        for filename, in db.session.query(column).filter(column.isnot(None), column != '').distinct():
+            if (folder, filename) not in known:
+                queue_image(folder, filename)
+                known.add((folder, filename))
+                queued += 1
+    db.session.commit()
+    return queued
+
+
+def claim_jobs(limit):
+    """
+    Marks up to limit pending jobs as running and returns them. Each claim is a
+    conditional UPDATE, so several workers can share the queue. Jobs left running
+    for longer than IMAGE_JOB_TIMEOUT (a worker died mid-job) are put back first.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config.get('IMAGE_JOB_TIMEOUT', 600))
+    db.session.execute(
+        update(ImageJob).where(ImageJob.status == 'running', ImageJob.claimed_at < stale).values(status='pending')
+    )
+    claimed = []
+    for job in ImageJob.query.filter_by(status='pending').order_by(ImageJob.id).limit(limit).all():
+        result = db.session.execute(
+            update(ImageJob).where(ImageJob.id == job.id, ImageJob.status == 'pending')
+            .values(status='running', claimed_at=now, attempts=ImageJob.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(job)
+    db.session.commit()
+    return claimed
+
+
+def run_jobs(executor=None, limit=10):
+    """
+    Claims a batch of jobs and processes them, in executor's processes when given
+    or else in this one. Results are committed in one transaction per batch, so
+    public pages are re-rendered once per batch rather than once per image.
+    Returns the number of jobs handled.
+    """
+    jobs = claim_jobs(limit)
+    if not jobs:
+        return 0
+
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    ffmpeg = current_app.config.get('FFMPEG_BINARY')
+    args = (RESPONSIVE_WIDTHS, modern_formats(), ffmpeg and shutil.which(ffmpeg),
+            current_app.config.get('IMAGE_MAX_PIXELS'))
+    if executor is not None:
+        futures = [executor.submit(process_image, os.path.join(upload_dir, job.folder), job.filename, *args)
+                   for job in jobs]
+        outcomes = [_outcome(future.result) for future in futures]
+    else:
+        outcomes = [_outcome(lambda job=job: process_image(os.path.join(upload_dir, job.folder), job.filename, *args))
+                    for job in jobs]
+
+    for job, (result, error) in zip(jobs, outcomes):
+        if error is None:
+            record_image(job.folder, job.filename, *result)
+            job.status, job.error = 'done', None
+        elif isinstance(error, (UnidentifiedImageError, FileNotFoundError, DecompressionBombWarning,
+                                DecompressionBombError)):
+            # Not an image Pillow can read (an SVG logo), deleted since, or too big to decode
+            # (uploaded before the header check): retrying won't help
+            job.status, job.error = 'skipped', str(error)
+        else:
+            current_app.logger.warning("Image job %s (%s/%s) failed: %s", job.id, job.folder, job.filename, error)
+            job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+            job.error = f"{type(error).__name__}: {error}"
+    db.session.commit()
+    return len(jobs)
+
+
+def _outcome(call):
+    try:
+        return call(), None
+    except Exception as e:
+        return None, e
+
+
+def work(processes=None, poll_interval=2, once=False):
+    """
+    Runs the image worker: processes queued jobs on every core until stopped,
+    or until the queue is empty when once is set.
+    """
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        while True:
+            handled = run_jobs(executor, limit=processes * 2)
+            if handled:
+                continue
+            if once:
+                return
+            # Don't hold a transaction open while idle
+            db.session.remove()
+            time.sleep(poll_interval)
@@ -0,0 +1,430 @@
+import base64
+import os
+import re
+import subprocess
+from io import BytesIO
+from flask import current_app, url_for
+from markupsafe import Markup
+from PIL import Image, ImageOps, ImageSequence, ExifTags, UnidentifiedImageError, features
+from app import db
+from app.cache import content_cache
+from app.models import (UploadedImage, ImageJob, Section, ContentItem, Program, TeamMember, Partnership, NewsArticle,
+                        Testimonial, Sponsor, GalleryItem)
+
+# Upload folders used by save_picture across the admin
+IMAGE_FOLDERS = ('programs', 'gallery', 'sponsors', 'news', 'partners', 'team', 'testimonials', 'sections', 'items')
+
+# Every column holding the filename of an upload, with the folder it lives in
+UPLOAD_COLUMNS = (
+    (Section.image_filename, 'sections'),
+    (ContentItem.image_filename, 'items'),
+    (Program.image_filename, 'programs'),
+    (TeamMember.image_filename, 'team'),
+    (Partnership.image_filename, 'partners'),
+    (NewsArticle.image_filename, 'news'),
+    (Testimonial.image_filename, 'testimonials'),
+    (Sponsor.logo_filename, 'sponsors'),
+    (GalleryItem.image_filename, 'gallery'),
+)
+
+# Widths of the resized copies made for every upload. Copies are only made
+# for widths smaller than the original.
+RESPONSIVE_WIDTHS = (320, 640, 1280, 2048)
+
+# Derivatives live next to the originals, in <folder>/derived/
+DERIVED_DIR = 'derived'
+
+# Formats we re-encode; anything else (SVG logos, still GIFs) is served as uploaded
+RESIZABLE_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+# Animated uploads are transcoded to an animated WebP (and an MP4 when ffmpeg
+# is available) instead of being resized
+ANIMATED_FORMATS = {'GIF', 'PNG', 'WEBP'}
+
+# Seconds ffmpeg may take to transcode one animation
+FFMPEG_TIMEOUT = 300
+
+# Modern encodings written next to each derivative, keyed by file extension:
+# (Pillow format, mimetype, Pillow feature that must be available)
+MODERN_FORMATS = {
+    'avif': ('AVIF', 'image/avif', 'avif'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+}
+
+# Longest side of the blurred preview inlined into pages while an image loads
+PLACEHOLDER_SIZE = 16
+
+
+def upload_path(folder, filename=''):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], folder, filename)
+
+
+def derivative_filename(filename, width):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{width}w{ext}"
+
+
+def derivative_path(folder, filename, width):
+    return upload_path(os.path.join(folder, DERIVED_DIR), derivative_filename(filename, width))
+
+
+def original_filename(filename):
+    """The upload a derivative filename was made from; originals are returned as is."""
+    stem, ext = os.path.splitext(filename)
+    return re.sub(r'-\d+w$', '', stem) + ext
+
+
+def modern_path(folder, filename):
+    """Path stem of the modern encodings of an original or derivative filename, without extension."""
+    return upload_path(os.path.join(folder, DERIVED_DIR), os.path.splitext(filename)[0])
+
+
+def modern_formats():
+    """Returns the extensions of the IMAGE_MODERN_FORMATS this Pillow build can write, best first."""
+    return [ext for ext in current_app.config.get('IMAGE_MODERN_FORMATS', ())
+            if ext in MODERN_FORMATS and features.check(MODERN_FORMATS[ext][2])]
+
+
+def _save_options(image_format):
+    if image_format == 'JPEG':
+        return {'quality': 82, 'optimize': True, 'progressive': True}
+    if image_format == 'WEBP':
+        return {'quality': 80, 'method': 4}
+    if image_format == 'AVIF':
+        return {'quality': 60, 'speed': 8}
+    return {'optimize': True}
+
+
+def _prepare(original):
+    image = ImageOps.exif_transpose(original)
+    if image.mode == 'P':
+        # Palette images only resize with nearest-neighbour sampling
+        image = image.convert('RGBA')
+    return image
+
+
+def _resize_width(image, width):
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+
+def _write_smaller(path, reference_size, write):
+    """
+    Calls write(tmp_path) and moves the result to path, unless it comes out no
+    smaller than reference_size bytes. Returns True when the file was kept.
+    """
+    tmp_path = path + '.tmp'
+    try:
+        write(tmp_path)
+        if os.path.getsize(tmp_path) >= reference_size:
+            os.remove(tmp_path)
+            return False
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Renamed into place so the negotiating route never serves a partial file
+    os.replace(tmp_path, path)
+    return True
+
+
+def _encode_modern(image, stem, formats, reference_size):
+    """Writes image as stem.<ext> for each format, unless it comes out no smaller than reference_size bytes."""
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    for ext in formats:
+        image_format = MODERN_FORMATS[ext][0]
+        _write_smaller(f"{stem}.{ext}", reference_size,
+                       lambda path: image.save(path, image_format, **_save_options(image_format)))
+
+
+def read_dimensions(path):
+    """
+    Returns the displayed (width, height) of an image from its header alone,
+    or None when Pillow can't read it (SVG).
+    """
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+                # Rotated a quarter turn on display
+                width, height = height, width
+            return width, height
+    except UnidentifiedImageError:
+        return None
+
+
+def placeholder_data(image):
+    """
+    Returns (dominant colour as #rrggbb, data: URI of a tiny blurred JPEG) for an
+    opaque image, or (None, None) for one with transparency, where a coloured
+    box would show through the loaded image.
+    """
+    if 'A' in image.getbands() and image.getchannel('A').getextrema()[0] < 255:
+        return None, None
+    image = image.convert('RGB')
+    sample = image.resize((64, 64), Image.BOX).quantize(8)
+    _, index = max(sample.getcolors())
+    color = '#{:02x}{:02x}{:02x}'.format(*sample.getpalette()[index * 3:index * 3 + 3])
+
+    preview = image.copy()
+    preview.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BOX)
+    data = BytesIO()
+    preview.save(data, 'JPEG', quality=40)
+    return color, 'data:image/jpeg;base64,' + base64.b64encode(data.getvalue()).decode('ascii')
+
+
+def generate_derivatives(upload_dir, filename, widths=RESPONSIVE_WIDTHS):
+    """
+    Writes a width-bounded copy of an uploaded image for every width smaller
+    than the original. Returns (width, height, derivative_widths, color, placeholder);
+    derivative_widths is None for formats we don't re-encode, see placeholder_data
+    for the rest.
+    """
+    with Image.open(os.path.join(upload_dir, filename)) as original:
+        image_format = original.format
+        image = _prepare(original)
+        width, height = image.size
+        color, placeholder = placeholder_data(image)
+        if image_format not in RESIZABLE_FORMATS or getattr(original, 'is_animated', False):
+            return width, height, None, color, placeholder
+
+        derived_dir = os.path.join(upload_dir, DERIVED_DIR)
+        os.makedirs(derived_dir, exist_ok=True)
+        made = []
+        for target in sorted(widths):
+            if target >= width:
+                break
+            _resize_width(image, target).save(os.path.join(derived_dir, derivative_filename(filename, target)),
+                                              image_format, **_save_options(image_format))
+            made.append(target)
+        return width, height, made, color, placeholder
+
+
+def encode_modern_formats(upload_dir, filename, widths, formats):
+    """Writes AVIF/WebP versions of an upload and of each of its derivatives into <upload_dir>/derived/."""
+    derived_dir = os.path.join(upload_dir, DERIVED_DIR)
+    stem = os.path.splitext(filename)[0]
+    source = os.path.join(upload_dir, filename)
+    with Image.open(source) as original:
+        image = _prepare(original)
+        _encode_modern(image, os.path.join(derived_dir, stem), formats, os.path.getsize(source))
+        for width in widths:
+            derivative = os.path.join(derived_dir, derivative_filename(filename, width))
+            _encode_modern(_resize_width(image, width), os.path.join(derived_dir, f"{stem}-{width}w"),
+                           formats, os.path.getsize(derivative))
+
+
+def is_animated(path):
+    with Image.open(path) as image:
+        return image.format in ANIMATED_FORMATS and getattr(image, 'is_animated', False)
+
+
+def transcode_animation(upload_dir, filename, formats, ffmpeg=None):
+    """
+    Writes an animated WebP of an animated upload into <upload_dir>/derived/
+    when 'webp' is among formats, and a silent MP4 when ffmpeg is the path of an
+    ffmpeg binary. Each is only kept when smaller than the upload. Returns True
+    when an MP4 was written.
+    """
+    derived_dir = os.path.join(upload_dir, DERIVED_DIR)
+    os.makedirs(derived_dir, exist_ok=True)
+    stem = os.path.join(derived_dir, os.path.splitext(filename)[0])
+    source = os.path.join(upload_dir, filename)
+    size = os.path.getsize(source)
+
+    if 'webp' in formats:
+        with Image.open(source) as original:
+            if original.format != 'WEBP':
+                durations = [frame.info.get('duration', 100) for frame in ImageSequence.Iterator(original)]
+                original.seek(0)
+                _write_smaller(f"{stem}.webp", size, lambda path: original.save(
+                    path, 'WEBP', save_all=True, duration=durations, loop=original.info.get('loop', 0),
+                    **_save_options('WEBP')))
+
+    if not ffmpeg:
+        return False
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-i', source, '-an', '-movflags', '+faststart',
+               '-pix_fmt', 'yuv420p', '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-f', 'mp4']
+    try:
+        return _write_smaller(f"{stem}.mp4", size, lambda path: subprocess.run(
+            command + [path], check=True, capture_output=True, timeout=FFMPEG_TIMEOUT))
+    except (OSError, subprocess.SubprocessError):
+        # The MP4 is optional; browsers still get the WebP or the original
+        return False
+
+
+def process_image(upload_dir, filename, widths=RESPONSIVE_WIDTHS, formats=(), ffmpeg=None, max_pixels=None):
+    """
+    Does all the processing of one upload: derivatives, then modern encodings,
+    or for an animation its WebP/MP4 transcodes. Works on files only, so the
+    image worker can run it in a separate process. Returns (width, height,
+    derivative_widths, color, placeholder) like generate_derivatives, plus
+    whether an MP4 was written. Images over max_pixels raise
+    DecompressionBombError before they are decoded.
+    """
+    if max_pixels:
+        with Image.open(os.path.join(upload_dir, filename)) as image:
+            _check_pixels(image, max_pixels)
+    return _process_image(upload_dir, filename, widths, formats, ffmpeg)
+
+
+def _process_image(upload_dir, filename, widths, formats, ffmpeg):
+    result = generate_derivatives(upload_dir, filename, widths)
+    made = result[2]
+    video = False
+    if made is not None and formats:
+        encode_modern_formats(upload_dir, filename, made, formats)
+    elif made is None and is_animated(os.path.join(upload_dir, filename)):
+        video = transcode_animation(upload_dir, filename, formats, ffmpeg)
+    return result + (video,)
+
+
+def _check_pixels(image, max_pixels):
+    """
+    Raises DecompressionBombError for an opened image over max_pixels, before
+    it is decoded. Unlike setting Image.MAX_IMAGE_PIXELS this leaves the limit
+    of everything else in the process alone.
+    """
+    if image.width * image.height > max_pixels:
+        raise Image.DecompressionBombError(
+            f"Image size ({image.width * image.height} pixels) exceeds limit of {max_pixels} pixels")
+
+
+class NotResizable(ValueError):
+    """Raised by resize_upload for uploads that must be served as they are."""
+
+
+def resize_upload(folder, filename, width, height, dest, image_format=None, max_pixels=None):
+    """
+    Writes the upload resized to width (height 0) or cropped to fill width x height
+    to dest, in image_format or else the original's format. Never upscales
+    width-bounded images. Returns the Pillow format name. Raises NotResizable
+    for animations, which would keep only their first frame, and for images
+    over max_pixels (uploaded before the header check), which are too big to
+    decode in a web worker.
+    """
+    with Image.open(upload_path(folder, filename)) as original:
+        if getattr(original, 'is_animated', False):
+            raise NotResizable(f"{filename} is animated")
+        if max_pixels and original.width * original.height > max_pixels:
+            raise NotResizable(f"{filename} has more than {max_pixels} pixels")
+        image_format = image_format or original.format
+        image = _prepare(original)
+        if height:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        elif width < image.width:
+            image = _resize_width(image, width)
+        if image_format in ('AVIF', 'WEBP', 'JPEG') and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() and image_format != 'JPEG' else 'RGB')
+        image.save(dest, image_format, **_save_options(image_format))
+        return image_format
+
+
+def accepted_formats(accept_mimetypes):
+    """Returns the enabled modern formats the client accepts, best first."""
+    # Only an explicit mention counts: old browsers send */* and can't decode AVIF
+    accepted = {value for value, quality in accept_mimetypes if quality > 0}
+    return [ext for ext in modern_formats() if MODERN_FORMATS[ext][1] in accepted]
+
+
+def negotiate(folder, filename, accept_mimetypes):
+    """
+    Returns (path, mimetype) of the best existing modern encoding of an original
+    or derivative filename that the client accepts, or (None, None).
+    """
+    stem = modern_path(folder, filename)
+    for ext in accepted_formats(accept_mimetypes):
+        if os.path.isfile(f"{stem}.{ext}"):
+            return f"{stem}.{ext}", MODERN_FORMATS[ext][1]
+    return None, None
+
+
+def processing_pending(folder, filename):
+    """Whether an upload has a job that hasn't finished, so more of its encodings may still appear."""
+    return db.session.query(ImageJob.query.filter(
+        ImageJob.folder == folder, ImageJob.filename == original_filename(filename),
+        ImageJob.status.in_(('pending', 'running'))).exists()).scalar()
+
+
+def record_image(folder, filename, width, height, widths, color=None, placeholder=None, video=False):
+    """Stores the processing results of an upload in the session, replacing earlier ones."""
+    record = UploadedImage.query.filter_by(folder=folder, filename=filename).first()
+    if record is None:
+        record = UploadedImage(folder=folder, filename=filename)
+        db.session.add(record)
+    record.width = width
+    record.height = height
+    record.widths = ','.join(str(w) for w in widths or [])
+    record.color = color
+    record.placeholder = placeholder
+    record.video = video
+    return record
+
+
+# --- Template helpers ---
+
+def load_uploaded_images():
+    """Loads the processing results of every upload, keyed by (folder, filename)."""
+    images = {}
+    for record in UploadedImage.query.all():
+        db.session.expunge(record)
+        images[(record.folder, record.filename)] = record
+    return images
+
+
+def image_info(folder, filename):
+    if not filename:
+        return None
+    images = content_cache.get_or_set('uploaded_images', load_uploaded_images, (UploadedImage.__tablename__,))
+    return images.get((folder, filename))
+
+
+def image_srcset(folder, filename):
+    """
+    Returns the srcset of an upload's derivatives plus the original, or '' for
+    files we don't process. The URLs go through main.negotiated_image so each
+    browser gets the best encoding it accepts.
+    """
+    info = image_info(folder, filename)
+    if info is None or not info.width:
+        return ''
+    candidates = [
+        f"{url_for('main.negotiated_image', folder=folder, filename=derivative_filename(filename, w), derived=True)} {w}w"
+        for w in info.widths_list
+    ]
+    candidates.append(f"{url_for('main.negotiated_image', folder=folder, filename=filename, derived=False)} {info.width}w")
+    return ', '.join(candidates)
+
+
+def image_video(folder, filename):
+    """Returns the URL of the MP4 transcode of an animated upload, or None."""
+    info = image_info(folder, filename)
+    if info is None or not info.video:
+        return None
+    stem = os.path.splitext(filename)[0]
+    return url_for('static', filename=f"uploads/{folder}/{DERIVED_DIR}/{stem}.mp4")
+
+
+def image_attrs(folder, filename, sizes='100vw', lazy=True, placeholder=False, style=''):
+    """
+    Renders the attributes of an <img> of an upload: srcset, sizes and the
+    intrinsic width/height (so the browser reserves its space) once we know
+    them, loading="lazy" unless lazy is False (images above the fold), and
+    style. With placeholder, the dominant colour and blurred preview are
+    prepended to style as a background, shown until the image has loaded.
+    """
+    info = image_info(folder, filename)
+    html = Markup('')
+    if info is not None and info.width:
+        html += Markup(' srcset="{}" sizes="{}" width="{}" height="{}"').format(
+            image_srcset(folder, filename), sizes, info.width, info.height)
+    if lazy:
+        html += Markup(' loading="lazy" decoding="async"')
+    if placeholder and info is not None and info.color:
+        background = f"background: {info.color}"
+        if info.placeholder:
+            background += f" url({info.placeholder}) center / cover no-repeat"
+        style = f"{background}; {style}" if style else background
+    if style:
+        html += Markup(' style="{}"').format(style)
+    return html
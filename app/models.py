@@ -25,8 +25,13 @@ class Page(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_coming_soon = db.Column(db.Boolean, default=False)
     sections = db.relationship('Section', backref='page', lazy='dynamic')
+    # Ordered, eager-loadable variant for public views; admin code keeps the query-style relationship
+    sections_list = db.relationship('Section', order_by='[Section.order, Section.id]', viewonly=True)
 
 class Section(db.Model):
+    __table_args__ = (
+        db.Index('ix_section_page_id_section_key', 'page_id', 'section_key'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     page_id = db.Column(db.Integer, db.ForeignKey('page.id'), nullable=False)
     section_key = db.Column(db.String(64), nullable=False)  # e.g. "who_we_are"
@@ -35,8 +40,14 @@ class Section(db.Model):
     image_filename = db.Column(db.String(255))
     video_url = db.Column(db.String(255))
     order = db.Column(db.Integer, default=0)
+    items_list = db.relationship('ContentItem', order_by='[ContentItem.order, ContentItem.id]', viewonly=True)
 
 class Program(db.Model):
+    __table_args__ = (
+        db.Index('ix_program_is_featured_order', 'is_featured', 'order'),
+        db.Index('ix_program_order', 'order'),
+        db.Index('ix_program_type', 'type'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     slug = db.Column(db.String(64), unique=True, nullable=False)
@@ -53,6 +64,9 @@ class Program(db.Model):
     
     # Relationships
     gallery_items = db.relationship('GalleryItem', backref='program', lazy='dynamic', cascade='all, delete-orphan')
+    # Ordered, eager-loadable variants for public views
+    gallery_items_list = db.relationship('GalleryItem', order_by='[GalleryItem.order, GalleryItem.id]', viewonly=True)
+    subcontents_list = db.relationship('ProgramSubContent', order_by='[ProgramSubContent.order, ProgramSubContent.id]', viewonly=True)
 
     @property
     def detail_url(self):
@@ -68,7 +82,7 @@ class ProgramSubContent(db.Model):
     order = db.Column(db.Integer, default=0)
     
     # Relationships
-    program = db.relationship('Program', backref=db.backref('subcontents', lazy='dynamic', cascade='all, delete-orphan'))
+    program = db.relationship('Program', backref=db.backref('subcontents', lazy='dynamic', order_by='ProgramSubContent.order', cascade='all, delete-orphan'))
 
 class TeamMember(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -89,6 +103,7 @@ class Partnership(db.Model):
     image_filename = db.Column(db.String(255)) # Looking for this first
     order = db.Column(db.Integer, default=0)
     tiers = db.relationship('SponsorshipTier', backref='partnership', lazy='dynamic')
+    tiers_list = db.relationship('SponsorshipTier', order_by='[SponsorshipTier.order, SponsorshipTier.id]', viewonly=True)
 
     @property
     def benefits_list(self):
@@ -105,6 +120,10 @@ class SponsorshipTier(db.Model):
     order = db.Column(db.Integer, default=0)
 
 class NewsArticle(db.Model):
+    __table_args__ = (
+        db.Index('ix_news_article_date_published_id', 'date_published', 'id'),
+        db.Index('ix_news_article_category', 'category'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text)
@@ -185,13 +204,27 @@ class SiteSettings(db.Model):
     footer_description = db.Column(db.Text)
     copyright_text = db.Column(db.String(255), default='&copy; 2025 Eidikos Global Events LLC. All Rights Reserved.')
 
+class ContentVersion(db.Model):
+    """Single-row counter bumped by every content commit, used to keep worker caches coherent."""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Sponsor(db.Model):
+    __table_args__ = (
+        db.Index('ix_sponsor_order', 'order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     logo_filename = db.Column(db.String(255))
     order = db.Column(db.Integer, default=0)
 
 class GalleryItem(db.Model):
+    __table_args__ = (
+        db.Index('ix_gallery_item_program_id_order', 'program_id', 'order'),
+        db.Index('ix_gallery_item_order', 'order'),
+        db.Index('ix_gallery_item_category_order', 'category', 'order'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255))
     image_filename = db.Column(db.String(255))
@@ -201,7 +234,61 @@ class GalleryItem(db.Model):
     order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class UploadedImage(db.Model):
+    """Processing results for one file under static/uploads, shared by every row that uses it."""
+    __table_args__ = (
+        db.UniqueConstraint('folder', 'filename', name='uq_uploaded_image_folder_filename'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    widths = db.Column(db.String(64), default='') # Comma-separated widths of the resized copies
+    color = db.Column(db.String(7)) # Dominant colour, #rrggbb
+    placeholder = db.Column(db.Text) # data: URI of a tiny blurred preview
+    video = db.Column(db.Boolean, default=False) # An animation with an MP4 transcode in derived/
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def widths_list(self):
+        return [int(w) for w in self.widths.split(',') if w] if self.widths else []
+
+class ImageJob(db.Model):
+    """An upload waiting for (or done with) processing by the image worker."""
+    __table_args__ = (
+        db.Index('ix_image_job_status_id', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending') # pending, running, done, failed, skipped
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    claimed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StoredUpload(db.Model):
+    """
+    Index of the content-addressed files under static/uploads. ref_count is the
+    number of rows whose image column names the file, kept up to date on flush
+    (see app.uploads).
+    """
+    __table_args__ = (
+        db.UniqueConstraint('folder', 'filename', name='uq_stored_upload_folder_filename'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(64), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Inquiry(db.Model):
+    __table_args__ = (
+        db.Index('ix_inquiry_status_created_at', 'status', 'created_at'),
+        db.Index('ix_inquiry_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(128), nullable=False)
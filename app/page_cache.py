@@ -0,0 +1,275 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial, wraps
+from flask import current_app, request, session, make_response
+from werkzeug.http import is_resource_modified
+from app.cache import content_cache, SingleFlight, UNVERSIONED_TABLES
+from app.compression import compression, add_vary, weaken_etag
+from app.assets import BUNDLE_DIR
+
+
+class CachedPage:
+    """
+    A rendered response body plus the headers needed to replay it. The body is
+    compressed once, here, for every encoding the compression middleware can
+    produce, and replayed to each client in the best one it accepts.
+    """
+    __slots__ = ('body', 'encoded', 'size', 'status', 'headers', 'stored_at')
+
+    def __init__(self, response):
+        self.body = response.get_data()
+        self.encoded = compression.encode_all(self.body, response.mimetype)
+        self.size = len(self.body) + sum(len(data) for data in self.encoded.values())
+        self.status = response.status_code
+        self.headers = [(k, v) for k, v in response.headers.items() if k not in ('Set-Cookie', 'Content-Length', 'Date')]
+        self.stored_at = time.monotonic()
+
+    def to_response(self, cache_status):
+        response = current_app.response_class(self.body, status=self.status, headers=self.headers)
+        if self.encoded:
+            add_vary(response.headers, 'Accept-Encoding')
+            encoding = compression.negotiate(request.accept_encodings)
+            if encoding in self.encoded and request.method != 'HEAD':
+                response.set_data(self.encoded[encoding])
+                response.content_encoding = encoding
+                weaken_etag(response.headers)
+        response.headers['X-Cache'] = cache_status
+        return response
+
+
+class PageCache:
+    """
+    In-memory LRU of rendered public pages, bounded by total body size.
+    Pages are fresh for PAGE_CACHE_TTL seconds; for PAGE_CACHE_GRACE seconds
+    after that one request re-renders the page while the others keep getting
+    the stale copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self._size = 0
+        self._refreshing = set()
+        self._generation = 0
+        self._flight = SingleFlight()
+        self.flight_timeout = None
+        self.enabled = False
+        self.ttl = 0
+        self.grace = 0
+        self.max_bytes = 0
+        self.build_id = None
+        self.built_at = None
+
+    def init_app(self, app):
+        app.extensions['page_cache'] = self
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        self.grace = app.config.get('PAGE_CACHE_GRACE', 30)
+        self.max_bytes = app.config.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        self.flight_timeout = app.config.get('SINGLE_FLIGHT_TIMEOUT', 10)
+        self.build_id, self.built_at = build_fingerprint(
+            app.root_path, exclude=(app.config['UPLOAD_FOLDER'], os.path.join(app.static_folder, BUNDLE_DIR)))
+        self.clear()
+        content_cache.add_listener(self.invalidate)
+
+    def validators(self):
+        """
+        Returns (ETag, Last-Modified) for the public pages as they render now,
+        or (None, None) before any content exists. Every content commit bumps
+        the content version and a deploy changes the build, so the pair changes
+        whenever any page could have; checking it costs no query.
+        """
+        if content_cache.version is None:
+            return None, None
+        etag = f"{content_cache.version}-{self.build_id}"
+        last_modified = max(filter(None, (content_cache.updated_at, self.built_at)))
+        return etag, last_modified
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def lookup(self, key):
+        """
+        Returns (page, regenerate). When regenerate is True the caller must
+        render the page and then call store() or release() for the key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                return None, True
+            age = now - page.stored_at
+            if age <= self.ttl:
+                self._pages.move_to_end(key)
+                return page, False
+            if age <= self.ttl + self.grace:
+                if key in self._refreshing:
+                    return page, False
+                self._refreshing.add(key)
+                return page, True
+            self._remove(key)
+            return None, True
+
+    def store(self, key, page, generation):
+        size = page.size
+        with self._lock:
+            # Skip pages rendered from content that was replaced mid-render
+            if generation != self._generation or size > self.max_bytes:
+                return
+            self._remove(key)
+            self._pages[key] = page
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+
+    def render_once(self, key, render):
+        """
+        Runs render() for a missing page, letting concurrent requests for the same
+        key wait for that render instead of each hitting the database.
+        render() returns (response, page); requests that waited get (None, page)
+        and must render for themselves if page is None.
+        """
+        (response, page), shared = self._flight.do(key, render, self.flight_timeout)
+        if shared:
+            return None, page
+        return response, page
+
+    def release(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def invalidate(self, tables=None):
+        """Drops every page after a content write; tables=None means a full clear."""
+        if tables is not None and not set(tables) - UNVERSIONED_TABLES:
+            return
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        page = self._pages.pop(key, None)
+        if page is not None:
+            self._size -= page.size
+
+
+page_cache = PageCache()
+
+
+def build_fingerprint(root, exclude=()):
+    """
+    Hashes the code, templates and static files under root, so the validators
+    of every page change with a deploy. Returns (12 hex digits, newest mtime as
+    a UTC datetime). Files are hashed by content, so workers and hosts agree.
+    """
+    exclude = {os.path.abspath(path) for path in exclude}
+    digest = hashlib.sha256()
+    newest = 0
+    for dirpath, dirnames, names in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames
+                             if d != '__pycache__' and os.path.abspath(os.path.join(dirpath, d)) not in exclude)
+        for name in sorted(names):
+            if name.endswith(('.pyc', '.gz', '.br')):
+                continue
+            path = os.path.join(dirpath, name)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(chunk)
+            newest = max(newest, os.path.getmtime(path))
+    return digest.hexdigest()[:12], datetime.utcfromtimestamp(int(newest))
+
+
+def _is_cacheable_request():
+    # Flashed messages and admin sessions make the page specific to one visitor
+    return (request.method in ('GET', 'HEAD')
+            and not session.get('logged_in')
+            and '_flashes' not in session)
+
+
+def _is_cacheable_response(response):
+    return (response.status_code == 200
+            and response.mimetype == 'text/html'
+            and not response.is_streamed
+            and 'Set-Cookie' not in response.headers)
+
+
+def cached_page(view=None, validate=None):
+    """
+    Serves an anonymous GET of the decorated view from the page cache, keyed on
+    path and query string. Pages carry an ETag and Last-Modified from the
+    content version, and a request that presents them gets a 304 before the
+    page cache or the view is consulted.
+
+    Views that can answer 404 or 400 pass validate, a cheap check called with
+    the view's arguments before a 304 that aborts the way the view would, so
+    missing content and bad parameters never get a 304:
+
+        @cached_page(validate=require_program)
+    """
+    if view is None:
+        return partial(cached_page, validate=validate)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _is_cacheable_request():
+            return view(*args, **kwargs)
+
+        etag, last_modified = page_cache.validators()
+        if etag is not None and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            if validate is not None:
+                validate(*args, **kwargs)
+            response = current_app.response_class(status=304)
+        elif page_cache.enabled:
+            response = _serve_cached(view, args, kwargs)
+        else:
+            response = make_response(view(*args, **kwargs))
+        if etag is not None and response.status_code in (200, 304) and not session.modified:
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def _serve_cached(view, args, kwargs):
+    """Returns the view's response from the page cache, rendering and storing it on a miss."""
+    key = request.full_path
+    page, regenerate = page_cache.lookup(key)
+    if not regenerate:
+        return page.to_response('HIT' if time.monotonic() - page.stored_at <= page_cache.ttl else 'STALE')
+
+    def render():
+        generation = page_cache.generation
+        response = make_response(view(*args, **kwargs))
+        page = None
+        if _is_cacheable_response(response):
+            page = CachedPage(response)
+            page_cache.store(key, page, generation)
+        return response, page
+
+    try:
+        if page is not None:
+            # Stale page: this request alone refreshes it, so no coalescing needed
+            response, page = render()
+        else:
+            response, page = page_cache.render_once(key, render)
+            if response is None:
+                if page is not None:
+                    return page.to_response('COALESCED')
+                response, page = render()
+    finally:
+        page_cache.release(key)
+    if page is not None:
+        # Replay the page just stored, so its body isn't compressed a second time
+        return page.to_response('MISS')
+    response.headers['X-Cache'] = 'MISS'
+    return response
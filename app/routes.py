@@ -1,118 +1,320 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, abort, current_app, make_response
+import os
 import time
-from app.models import Page, Section, Program, TeamMember, Partnership, NewsArticle, Testimonial, ImpactMetric, ContactInfo, InquiryType, SocialMedia, SiteSettings, Sponsor, ProgramSubContent, GalleryItem, Inquiry
+import calendar
+from PIL import Image, UnidentifiedImageError
+from werkzeug.utils import secure_filename
+from app.models import ContactInfo, InquiryType, SocialMedia, SiteSettings, Sponsor, Inquiry
 from app import db
+from app.cache import content_cache
+from app.content import get_content, decode_news_cursor, decode_gallery_cursor
+from app.page_cache import cached_page
+from app.image_cache import image_cache
+from app.assets import immutable_file
+from app.images import IMAGE_FOLDERS, DERIVED_DIR, MODERN_FORMATS, upload_path, resize_upload, negotiate, accepted_formats, \
+    processing_pending, NotResizable
 
 main = Blueprint('main', __name__)
 
-@main.context_processor
-def inject_globals():
-    """Inject global variables into all templates."""
-    return {
+GLOBAL_TABLES = (SocialMedia.__tablename__, ContactInfo.__tablename__,
+                 SiteSettings.__tablename__, Sponsor.__tablename__)
+
+def load_globals():
+    """Loads the footer/ticker data shared by every public template."""
+    site_globals = {
         'social_media': SocialMedia.query.all(),
         'global_contact_info': ContactInfo.query.first(),
         'site_settings': SiteSettings.query.first(),
-        'sponsors': Sponsor.query.order_by('order').all(),
-        'ProgramSubContent': ProgramSubContent
+        'sponsors': Sponsor.query.order_by('order').all()
     }
+    # Detach the rows so they stay readable after this request's session is gone
+    for obj in site_globals['social_media'] + site_globals['sponsors'] + [site_globals['global_contact_info'], site_globals['site_settings']]:
+        if obj is not None:
+            db.session.expunge(obj)
+    site_globals['social_media'] = tuple(site_globals['social_media'])
+    site_globals['sponsors'] = tuple(site_globals['sponsors'])
+    return site_globals
 
-def get_page_data(slug):
-    """Helper to fetch page and its sections."""
-    page = Page.query.filter_by(slug=slug).first()
-    sections = {}
-    if page:
-        for section in page.sections:
-            sections[section.section_key] = section
-    return page, sections
+@main.context_processor
+def inject_globals():
+    """Inject global variables into all templates."""
+    site_globals = content_cache.get_or_set('site_globals', load_globals, GLOBAL_TABLES)
+    return dict(site_globals)
 
 @main.route('/')
+@cached_page
 def index():
-    page, sections = get_page_data('home')
+    content = get_content()
+    page, sections = content.page_data('home')
     # Fetch programs marked as featured for the highlights section
-    programs = Program.query.filter_by(is_featured=True).order_by(Program.order.asc()).all()
+    programs = content.featured_programs()
     return render_template('index.html', page=page, sections=sections, programs=programs)
 
 @main.route('/about')
+@cached_page
 def about():
-    page, sections = get_page_data('about')
-    team_members = TeamMember.query.all()
+    content = get_content()
+    page, sections = content.page_data('about')
+    team_members = content.team_members()
     return render_template('about.html', page=page, sections=sections, team_members=team_members)
 
 @main.route('/programs')
+@cached_page
 def programs():
-    page, sections = get_page_data('programs')
+    content = get_content()
+    page, sections = content.page_data('programs')
     # Simple list of all Programs for the listing page
-    programs = Program.query.order_by(Program.order.asc()).all()
-    return render_template('programs.html', page=page, sections=sections, programs=programs)
+    programs = content.programs()
+    # Subcontents for every card in one go, instead of a query per program
+    subcontents = content.subcontents_by_program(programs)
+    return render_template('programs.html', page=page, sections=sections, programs=programs,
+                           subcontents=subcontents)
+
+def require_program(slug):
+    program = get_content().program_by_slug(slug)
+    if program is None:
+        abort(404)
+    return program
 
 @main.route('/programs/<slug>')
 @main.route('/program/<slug>')
+@cached_page(validate=require_program)
 def program_detail(slug):
-    program = Program.query.filter_by(slug=slug).first_or_404()
-    related_programs = Program.query.filter(
-        Program.type == program.type, 
-        Program.id != program.id
-    ).limit(3).all()
+    content = get_content()
+    program = require_program(slug)
+    related_programs = content.related_programs(program)
     # Fetch gallery items linked to this program
-    gallery_items = program.gallery_items.order_by(GalleryItem.order.asc()).all()
+    gallery_items = content.program_gallery(program)
     return render_template('program_detail.html', program=program, related_programs=related_programs, gallery_items=gallery_items)
 
 @main.route('/digital')
+@cached_page
 def digital():
-    page, sections = get_page_data('digital')
+    page, sections = get_content().page_data('digital')
     return render_template('digital.html', page=page, sections=sections)
 
 @main.route('/partnerships')
+@cached_page
 def partnerships():
-    page, sections = get_page_data('partnerships')
-    partnerships = Partnership.query.all()
+    content = get_content()
+    page, sections = content.page_data('partnerships')
+    partnerships = content.partnerships()
     return render_template('partnerships.html', page=page, sections=sections, partnerships=partnerships)
 
 @main.route('/join')
+@cached_page
 def join():
-    page, sections = get_page_data('join')
+    page, sections = get_content().page_data('join')
     # "Join Categories" are currently static in template or could be Sections
     return render_template('join.html', page=page, sections=sections)
 
+def gallery_filters():
+    """Reads the ?program=, ?category= and ?media= gallery filters, rejecting malformed values."""
+    filters = {}
+    if request.args.get('program'):
+        filters['program'] = request.args.get('program', type=int)
+        if filters['program'] is None:
+            abort(400)
+    if request.args.get('category'):
+        filters['category'] = request.args['category']
+    if request.args.get('media'):
+        if request.args['media'] not in ('image', 'video'):
+            abort(400)
+        filters['media'] = request.args['media']
+    return filters
+
+def gallery_cursor():
+    """Reads the ?after= cursor of a gallery page, rejecting malformed values."""
+    try:
+        return decode_gallery_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        abort(400)
+
+def gallery_page(filters, cursor=None):
+    """Returns (items, next_cursor) for one page of the filtered gallery."""
+    return get_content().gallery_page(
+        cursor, limit=current_app.config['GALLERY_PER_PAGE'], program_id=filters.get('program'),
+        category=filters.get('category'), media=filters.get('media'))
+
+def check_gallery_args():
+    gallery_filters()
+    gallery_cursor()
+
 @main.route('/gallery')
+@cached_page(validate=check_gallery_args)
 def gallery():
-    page, sections = get_page_data('gallery') # Optional page data
-    gallery_items = GalleryItem.query.order_by(GalleryItem.order.asc()).all()
-    gallery_programs = Program.query.join(GalleryItem).distinct().all()
+    content = get_content()
+    page, sections = content.page_data('gallery') # Optional page data
+    filters = gallery_filters()
+    # One page; the grid fetches the rest from gallery_items as it scrolls, and
+    # without JavaScript "Load More" links to the next full page
+    gallery_items, next_cursor = gallery_page(filters, gallery_cursor())
+    gallery_programs = content.gallery_programs()
+    gallery_categories = content.gallery_categories()
+    next_url = next_items_url = None
+    if next_cursor:
+        next_url = url_for('main.gallery', after=next_cursor, **filters)
+        next_items_url = url_for('main.gallery_items', after=next_cursor, **filters)
     return render_template('gallery.html', page=page, sections=sections, 
-                           gallery_items=gallery_items, gallery_programs=gallery_programs)
+                           gallery_items=gallery_items, gallery_programs=gallery_programs,
+                           gallery_categories=gallery_categories, filters=filters, next_url=next_url,
+                           next_items_url=next_items_url)
+
+@main.route('/gallery/items')
+@cached_page(validate=check_gallery_args)
+def gallery_items():
+    """Returns a page of gallery items as an HTML fragment for the gallery's infinite scroll."""
+    filters = gallery_filters()
+    items, next_cursor = gallery_page(filters, gallery_cursor())
+    response = make_response(render_template('partials/gallery_items.html', gallery_items=items))
+    if next_cursor:
+        response.headers['X-Next-Page'] = url_for('main.gallery_items', after=next_cursor, **filters)
+    return response
+
+def news_cursor():
+    """Reads the ?before= cursor of a news page, rejecting malformed values."""
+    try:
+        return decode_news_cursor(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        abort(400)
+
+def require_news_cursor():
+    cursor = news_cursor()
+    if cursor is None:
+        abort(400)
+    return cursor
 
 @main.route('/news-impact')
+@cached_page(validate=news_cursor)
 def news_impact():
-    page, sections = get_page_data('news-impact')
-    news_articles = NewsArticle.query.order_by(NewsArticle.date_published.desc()).all()
-    impact_metrics = ImpactMetric.query.all()
-    testimonials = Testimonial.query.all()
-    gallery_items = GalleryItem.query.order_by(GalleryItem.order.asc()).limit(6).all()
+    content = get_content()
+    page, sections = content.page_data('news-impact')
+    # One page of news; "Load More" fetches the rest through news_more, or
+    # without JavaScript links to the next full page
+    news_articles, next_cursor = content.news_page(news_cursor(), limit=current_app.config['NEWS_PER_PAGE'])
+    archive_months = content.news_archive_months()
+    impact_metrics = content.impact_metrics()
+    testimonials = content.testimonials()
+    gallery_items = content.gallery_items(limit=6)
     # Get only programs that have gallery items for the filter
-    gallery_programs = Program.query.join(GalleryItem).distinct().all()
+    gallery_programs = content.gallery_programs()
     return render_template('news-impact.html', page=page, sections=sections, 
-                           news_articles=news_articles, impact_metrics=impact_metrics, 
+                           news_articles=news_articles, next_cursor=next_cursor,
+                           archive_months=archive_months, impact_metrics=impact_metrics, 
                            testimonials=testimonials, gallery_items=gallery_items,
                            gallery_programs=gallery_programs)
 
+@main.route('/news-impact/more')
+@cached_page(validate=require_news_cursor)
+def news_more():
+    """Returns the next page of news cards as an HTML fragment for the "Load More" button."""
+    cursor = require_news_cursor()
+    news_articles, next_cursor = get_content().news_page(cursor, limit=current_app.config['NEWS_PER_PAGE'])
+    response = make_response(render_template('partials/news_cards.html', news_articles=news_articles))
+    if next_cursor:
+        response.headers['X-Next-Page'] = url_for('main.news_more', before=next_cursor)
+    return response
+
+def require_news_archive(year, month=None):
+    """Returns the articles published in year (and month), or aborts with 404 if there are none."""
+    if not 1 <= year <= 9998 or (month is not None and not 1 <= month <= 12):
+        abort(404)
+    news_articles = get_content().news_archive(year, month)
+    if not news_articles:
+        abort(404)
+    return news_articles
+
+@main.route('/news-impact/archive/<int:year>')
+@main.route('/news-impact/archive/<int:year>/<int:month>')
+@cached_page(validate=require_news_archive)
+def news_archive(year, month=None):
+    content = get_content()
+    news_articles = require_news_archive(year, month)
+    period = f"{calendar.month_name[month]} {year}" if month else str(year)
+    return render_template('news_archive.html', news_articles=news_articles, period=period,
+                           archive_months=content.news_archive_months())
+
+def require_news_article(article_id):
+    article = get_content().news_article(article_id)
+    if article is None:
+        abort(404)
+    return article
+
 @main.route('/news-impact/<int:article_id>')
+@cached_page(validate=require_news_article)
 def news_detail(article_id):
-    article = NewsArticle.query.get_or_404(article_id)
+    content = get_content()
+    article = require_news_article(article_id)
     # Get 3 recent articles excluding current one for sidebar/related
-    recent_articles = NewsArticle.query.filter(NewsArticle.id != article.id).order_by(NewsArticle.date_published.desc()).limit(3).all()
+    recent_articles = content.recent_articles(article)
     
     # Get unique categories and counts for sidebar
-    categories_data = db.session.query(NewsArticle.category, db.func.count(NewsArticle.id)).group_by(NewsArticle.category).all()
-    categories = [{'name': cat, 'count': count} for cat, count in categories_data if cat]
+    categories = content.news_categories()
     
     return render_template('news_detail.html', article=article, recent_articles=recent_articles, categories=categories)
 
+@main.route('/images/<folder>/<filename>', defaults={'derived': False})
+@main.route('/images/<folder>/derived/<filename>', defaults={'derived': True})
+def negotiated_image(folder, filename, derived):
+    """
+    Serves an upload or one of its derivatives as AVIF or WebP when the browser
+    accepts it and that encoding has been generated, else as uploaded. Until
+    the upload's processing job has finished, that fallback is only cached
+    briefly, so the modern encoding is picked up once it exists.
+    """
+    if folder not in IMAGE_FOLDERS or filename != secure_filename(filename):
+        abort(404)
+    source = upload_path(os.path.join(folder, DERIVED_DIR) if derived else folder, filename)
+    if not os.path.isfile(source):
+        abort(404)
+    path, mimetype = negotiate(folder, filename, request.accept_mimetypes)
+    max_age = None
+    if path is None and accepted_formats(request.accept_mimetypes) and processing_pending(folder, filename):
+        max_age = current_app.config['IMAGE_FALLBACK_MAX_AGE']
+    return immutable_file(path or source, mimetype, vary_accept=True, max_age=max_age)
+
+@main.route('/img/<int:width>x<int:height>/<folder>/<filename>')
+def resized_image(width, height, folder, filename):
+    """
+    Serves an upload resized to one of the IMAGE_RESIZE_SIZES (height 0 keeps the
+    aspect ratio), as AVIF/WebP for browsers that accept it. Results are kept in
+    the on-disk image cache; upload names never change content, so browsers may
+    cache them for good.
+    """
+    if f"{width}x{height}" not in current_app.config['IMAGE_RESIZE_SIZES'] or folder not in IMAGE_FOLDERS:
+        abort(404)
+    if filename != secure_filename(filename) or not os.path.isfile(upload_path(folder, filename)):
+        abort(404)
+    stem, ext = os.path.splitext(filename)
+    image_format = None
+    accepted = accepted_formats(request.accept_mimetypes)
+    if accepted:
+        image_format, ext = MODERN_FORMATS[accepted[0]][0], '.' + accepted[0]
+    key = f"{folder}/{width}x{height}/{stem}{ext}"
+    try:
+        path = image_cache.get_or_create(key, lambda dest: resize_upload(
+            folder, filename, width, height, dest, image_format, current_app.config['IMAGE_MAX_PIXELS']))
+    except NotResizable:
+        # An animation or a huge image: served as uploaded, or as its WebP
+        return negotiated_image(folder, filename, derived=False)
+    except Image.DecompressionBombError as e:
+        # Too big to decode safely (uploaded before the header check); browsers shouldn't try either
+        current_app.logger.warning("Not serving %s/%s: %s", folder, filename, e)
+        abort(404)
+    except (UnidentifiedImageError, OSError) as e:
+        # Not something Pillow can resize (e.g. an SVG logo): serve it as uploaded
+        current_app.logger.info("Serving %s/%s unresized: %s", folder, filename, e)
+        return immutable_file(upload_path(folder, filename), vary_accept=True,
+                              max_age=current_app.config['IMAGE_FALLBACK_MAX_AGE'])
+    return immutable_file(path, vary_accept=True)
+
 @main.route('/contact', methods=['GET', 'POST'], strict_slashes=False)
+@cached_page
 def contact():
-    page, sections = get_page_data('contact')
-    contact_info = ContactInfo.query.first()
-    inquiry_types = InquiryType.query.all()
+    content = get_content()
+    page, sections = content.page_data('contact')
+    contact_info = content.contact_info()
+    inquiry_types = content.inquiry_types()
     
     # Handle pre-selection from URL
     selected_type_id = request.args.get('type_id', type=int)
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import warnings
+import zipfile
+from datetime import datetime
+from flask import current_app
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from werkzeug.datastructures import FileStorage
+from app import db
+from app.images import UPLOAD_COLUMNS, DERIVED_DIR
+from app.image_cache import image_cache
+from app.assets import ENCODED_SUFFIXES
+from app.models import StoredUpload, UploadedImage, ImageJob
+
+# Hex digits of the SHA-256 kept in the filename (128 bits)
+HASH_LENGTH = 32
+
+CHUNK_SIZE = 64 * 1024
+
+# Pillow format each accepted image extension must turn out to be
+UPLOAD_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.gif': 'GIF', '.webp': 'WEBP'}
+
+# Images taken from bulk uploads and ZIP archives
+BULK_IMAGE_EXTENSIONS = set(UPLOAD_FORMATS)
+
+# Width suffix of a derivative's stem: <stem>-<width>w
+_DERIVATIVE_SUFFIX = re.compile(r'-\d+w$')
+
+# (model class, attribute name) -> folder, for the ref-count listener
+_UPLOAD_ATTRIBUTES = {}
+for _column, _folder in UPLOAD_COLUMNS:
+    _UPLOAD_ATTRIBUTES.setdefault(_column.class_, []).append((_column.key, _folder))
+
+
+class InvalidImage(ValueError):
+    """An upload that isn't the image it claims to be, or is too big to process."""
+
+
+def check_image_header(file_storage):
+    """
+    Checks an uploaded image from its header alone, before anything is written
+    or decoded: its format must match its extension, and its dimensions must be
+    within IMAGE_MAX_DIMENSION per side and IMAGE_MAX_PIXELS in total. SVGs only
+    need to look like SVG. Leaves the stream where it was; raises InvalidImage
+    with a message for the user.
+    """
+    max_dimension = current_app.config.get('IMAGE_MAX_DIMENSION', 12000)
+    max_pixels = current_app.config.get('IMAGE_MAX_PIXELS', 50000000)
+    limits = f"images may be at most {max_dimension} pixels per side and {max_pixels // 1000000} megapixels."
+    stream = file_storage.stream
+    ext = os.path.splitext(file_storage.filename or '')[1].lower()
+    start = stream.tell()
+    try:
+        if ext == '.svg':
+            if b'<svg' not in stream.read(4096).lower():
+                raise InvalidImage("The file is not an SVG image.")
+            return
+        if ext not in UPLOAD_FORMATS:
+            raise InvalidImage("Unsupported image type.")
+        try:
+            with warnings.catch_warnings():
+                # Pillow's own bomb check; ours below uses the configured limits
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                with Image.open(stream, formats=[UPLOAD_FORMATS[ext]]) as image:
+                    width, height = image.size
+        except Image.DecompressionBombError:
+            raise InvalidImage(f"The image is far too large; {limits}")
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise InvalidImage(f"The file is not a valid {ext[1:].upper()} image.")
+    finally:
+        stream.seek(start)
+
+    if width > max_dimension or height > max_dimension or width * height > max_pixels:
+        raise InvalidImage(f"The image is {width}x{height} pixels; {limits}")
+
+
+def content_filename(digest, original_filename):
+    _, ext = os.path.splitext(original_filename)
+    return digest[:HASH_LENGTH] + ext.lower()
+
+
+def store_upload(file_storage, folder):
+    """
+    Streams an upload into <UPLOAD_FOLDER>/<folder>/, hashing it on the way, and
+    names it after its content. A file that is already stored is not written
+    again. Returns (filename, size).
+    """
+    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], folder)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        filename = content_filename(digest.hexdigest(), file_storage.filename)
+        path = os.path.join(upload_dir, filename)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # Restart the garbage collector's grace period for the reused file
+            os.utime(path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename, size
+
+
+def adjust_ref_count(session, folder, filename, delta, size=None):
+    """
+    Adds delta to a stored file's ref_count, creating its index row if there is
+    none yet (files uploaded before the index existed). Returns True when the
+    row was created.
+    """
+    values = {'ref_count': StoredUpload.ref_count + delta}
+    if size is not None:
+        values['size'] = size
+    result = session.execute(
+        update(StoredUpload).where(StoredUpload.folder == folder, StoredUpload.filename == filename).values(**values)
+    )
+    if result.rowcount:
+        return False
+    session.execute(insert(StoredUpload).values(folder=folder, filename=filename, size=size,
+                                                ref_count=max(delta, 0), created_at=datetime.utcnow()))
+    return True
+
+
+def register_upload(session, folder, filename, size):
+    """Makes sure a stored file is in the index. Returns True when it wasn't, i.e. it still needs processing."""
+    return adjust_ref_count(session, folder, filename, 0, size)
+
+
+class TooManyFiles(ValueError):
+    pass
+
+
+def iter_bulk_images(files, max_files, max_file_size):
+    """
+    Yields a FileStorage for every image among the uploaded files, opening ZIP
+    archives member by member so nothing is held in memory whole. Archive
+    members bigger than max_file_size are skipped; more than max_files images
+    raise TooManyFiles. Raises zipfile.BadZipFile for a broken archive.
+    """
+    count = 0
+    for upload in files:
+        if not upload or not upload.filename:
+            continue
+        ext = os.path.splitext(upload.filename)[1].lower()
+        if ext == '.zip':
+            images = _iter_archive(upload, max_file_size)
+        elif ext in BULK_IMAGE_EXTENSIONS:
+            images = [upload]
+        else:
+            continue
+        for image in images:
+            count += 1
+            if count > max_files:
+                raise TooManyFiles(f"More than {max_files} images")
+            yield image
+
+
+def _iter_archive(upload, max_file_size):
+    with zipfile.ZipFile(upload.stream) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                continue
+            if os.path.splitext(name)[1].lower() not in BULK_IMAGE_EXTENSIONS or info.file_size > max_file_size:
+                continue
+            # Reads stop at the declared size, so the header can't hide a bigger file
+            with archive.open(info) as member:
+                yield FileStorage(stream=member, filename=name)
+
+
+def referenced_uploads():
+    """Returns {(folder, filename)} for every upload named by an image column."""
+    referenced = set()
+    for column, folder in UPLOAD_COLUMNS:
+        for filename, in db.session.query(column).filter(column.isnot(None), column != '').distinct():
+            referenced.add((folder, filename))
+    return referenced
+
+
+def find_orphaned_uploads(grace_period=3600):
+    """
+    Scans UPLOAD_FOLDER for files no row references: originals whose name is
+    in no image column, and derivatives or encodings of such originals. Files
+    modified in the last grace_period seconds are skipped, since their row may
+    not be committed yet. Returns [(path relative to UPLOAD_FOLDER, size), ...].
+    """
+    root = current_app.config['UPLOAD_FOLDER']
+    referenced = referenced_uploads()
+    live_stems = {(folder, os.path.splitext(filename)[0]) for folder, filename in referenced}
+    cutoff = time.time() - grace_period
+    skip = {os.path.abspath(image_cache.directory)} if image_cache.directory else set()
+
+    orphans = []
+    for dirpath, dirnames, names in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) not in skip)
+        relative = os.path.relpath(dirpath, root)
+        relative = '' if relative == '.' else relative
+        head, tail = os.path.split(relative)
+        for name in sorted(names):
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            if name.endswith(ENCODED_SUFFIXES):
+                # Precompressed sibling (see app.assets.precompress): lives as long as its file
+                name = os.path.splitext(name)[0]
+            if tail == DERIVED_DIR:
+                stem = os.path.splitext(name)[0]
+                live = (head, stem) in live_stems or (head, _DERIVATIVE_SUFFIX.sub('', stem)) in live_stems
+            else:
+                live = (relative, name) in referenced
+            if not live:
+                orphans.append((os.path.relpath(path, root), stat.st_size))
+    return orphans
+
+
+def remove_orphaned_uploads(orphans):
+    """
+    Deletes the given files (as returned by find_orphaned_uploads) and the index,
+    processing and job rows of the originals among them. Returns bytes freed.
+    """
+    root = current_app.config['UPLOAD_FOLDER']
+    freed = 0
+    for relative, size in orphans:
+        try:
+            os.remove(os.path.join(root, relative))
+        except FileNotFoundError:
+            continue
+        freed += size
+        folder, filename = os.path.split(relative)
+        if os.path.basename(folder) != DERIVED_DIR:
+            for model in (StoredUpload, UploadedImage, ImageJob):
+                model.query.filter_by(folder=folder, filename=filename).delete()
+    db.session.commit()
+    return freed
+
+
+# --- Session events ---
+# Reference counts follow the image columns of every model in UPLOAD_COLUMNS:
+# new rows add a reference, deleted rows drop one, and changing a column moves
+# it from the old file to the new one. The updates run inside the flush's
+# transaction, so a rollback undoes them together with the rows.
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+for _column, _ in UPLOAD_COLUMNS:
+    # Load the previous filename before it is overwritten, even on expired
+    # rows, so the flush can drop its reference
+    event.listen(_column, 'set', _keep_old_value, active_history=True)
+
+
+@event.listens_for(Session, 'before_flush')
+def _count_upload_references(session, flush_context, instances):
+    deltas = {}
+
+    def add(folder, filename, delta):
+        if filename:
+            deltas[(folder, filename)] = deltas.get((folder, filename), 0) + delta
+
+    for obj in session.new:
+        for key, folder in _UPLOAD_ATTRIBUTES.get(type(obj), ()):
+            add(folder, getattr(obj, key), 1)
+    for obj in session.deleted:
+        for key, folder in _UPLOAD_ATTRIBUTES.get(type(obj), ()):
+            history = get_history(obj, key)
+            for filename in history.unchanged or history.deleted:
+                add(folder, filename, -1)
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        for key, folder in _UPLOAD_ATTRIBUTES.get(type(obj), ()):
+            history = get_history(obj, key)
+            for filename in history.deleted:
+                add(folder, filename, -1)
+            for filename in history.added:
+                add(folder, filename, 1)
+
+    for (folder, filename), delta in deltas.items():
+        if delta:
+            adjust_ref_count(session, folder, filename, delta)
@@ -1,8 +1,9 @@
-import os
-import secrets
-from PIL import Image
-from flask import current_app, url_for
+from flask import url_for
 import re
+from app import db
+from app.images import upload_path, read_dimensions, record_image
+from app.image_jobs import queue_image
+from app.uploads import check_image_header, store_upload, register_upload
 
 def slugify(s):
     """
@@ -14,30 +15,30 @@ def slugify(s):
     s = re.sub(r'^-+|-+$', '', s)
     return s
 
-def save_picture(form_picture, folder=''):
+def save_picture(form_picture, folder='', jobs=None):
     """
     Saves an uploaded picture to the static/uploads directory.
     If 'folder' is provided, it saves to static/uploads/folder.
+    Files are named after a hash of their content, so uploading the same image
+    again reuses the stored copy and its processed versions.
+    Its dimensions are recorded straight away; resizing, re-encoding and the
+    placeholder are queued for the image worker (see app.image_jobs); when
+    jobs is a list, a job queued for the file is appended to it.
     Returns the filename.
     """
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    
-    # Ensure directory exists
-    upload_path = os.path.join(current_app.root_path, 'static', 'uploads', folder)
-    os.makedirs(upload_path, exist_ok=True)
-    
-    picture_path = os.path.join(upload_path, picture_fn)
+    # Raises InvalidImage before anything is written; forms run the same check
+    check_image_header(form_picture)
 
-    # Optional: Resize image if needed (using Pillow)
-    # output_size = (800, 800)
-    # i = Image.open(form_picture)
-    # i.thumbnail(output_size)
-    # i.save(picture_path)
-    
-    # Just save for now without resizing to preserve quality/animations
-    form_picture.save(picture_path)
+    # The original is kept untouched; templates use it until the worker is done
+    picture_fn, size = store_upload(form_picture, folder)
+    if register_upload(db.session, folder, picture_fn, size):
+        # The header gives the dimensions right away, so pages can reserve the space
+        dimensions = read_dimensions(upload_path(folder, picture_fn))
+        if dimensions:
+            record_image(folder, picture_fn, *dimensions, [])
+        job = queue_image(folder, picture_fn)
+        if jobs is not None:
+            jobs.append(job)
 
     return picture_fn
 
@@ -7,3 +7,78 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app', 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+
+    # Uploaded images bigger than this are rejected from their header, before
+    # anything is decoded; the image worker refuses to decode them too
+    IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 12000))  # pixels per side
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50000000))  # width x height
+
+    # Serve public pages from an in-memory snapshot of the CMS content.
+    # Set CONTENT_SNAPSHOT_ENABLED=0 to fall back to live queries.
+    CONTENT_SNAPSHOT_ENABLED = os.environ.get('CONTENT_SNAPSHOT_ENABLED', '1') == '1'
+
+    # How often (in seconds) each worker checks the shared content version
+    # to drop caches that another worker's admin save made stale.
+    CONTENT_VERSION_CHECK_INTERVAL = float(os.environ.get('CONTENT_VERSION_CHECK_INTERVAL', 2))
+
+    # Full-page cache for anonymous visitors of the public pages
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # seconds a page is served fresh
+    PAGE_CACHE_GRACE = int(os.environ.get('PAGE_CACHE_GRACE', 30))  # seconds a stale page may be served while it re-renders
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Seconds a request waits for another thread rendering the same page or
+    # snapshot before doing the work itself
+    SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 10))
+
+    # News cards per page on /news-impact and per "Load More" request
+    NEWS_PER_PAGE = int(os.environ.get('NEWS_PER_PAGE', 9))
+
+    # url_for('static', ...) emits content-hashed filenames (style.<hash>.css)
+    # that are served as immutable for a year
+    ASSET_FINGERPRINTS = os.environ.get('ASSET_FINGERPRINTS', '1') != '0'
+
+    # HTML and JSON responses of at least COMPRESS_MIN_SIZE bytes are brotli- or
+    # gzip-compressed on the fly, at levels that keep it to about a millisecond
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 5))  # 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))  # 0-11
+    COMPRESS_MIMETYPES = ('text/html', 'application/json')
+
+    # Gallery items per page on /gallery and per infinite-scroll request
+    GALLERY_PER_PAGE = int(os.environ.get('GALLERY_PER_PAGE', 12))
+
+    # Limits of the admin's bulk gallery upload (multiple files or a ZIP). Files
+    # are spooled to disk while the request is parsed, so these bound disk use
+    # and request time rather than memory.
+    GALLERY_BULK_MAX_BYTES = int(os.environ.get('GALLERY_BULK_MAX_BYTES', 1024 * 1024 * 1024))
+    GALLERY_BULK_MAX_FILES = int(os.environ.get('GALLERY_BULK_MAX_FILES', 500))
+
+    # On-demand resizing at /img/<w>x<h>/<folder>/<filename>. Only these sizes
+    # are served (a height of 0 keeps the aspect ratio), so the cache can't be
+    # filled with arbitrary variants.
+    IMAGE_RESIZE_SIZES = tuple(os.environ.get(
+        'IMAGE_RESIZE_SIZES', '320x0,640x0,1280x0,2048x0,150x150,300x300,400x300,800x600').split(','))
+    IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR')  # defaults to <instance>/image_cache
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # AVIF/WebP copies written for every upload, best first. They are served
+    # to browsers that list them in Accept; everyone else gets the original format.
+    IMAGE_MODERN_FORMATS = tuple(f for f in os.environ.get('IMAGE_MODERN_FORMATS', 'avif,webp').split(',') if f)
+    # How long browsers may keep an original served while its AVIF/WebP copy
+    # is still being made, or an upload that couldn't be resized
+    IMAGE_FALLBACK_MAX_AGE = int(os.environ.get('IMAGE_FALLBACK_MAX_AGE', 300))  # seconds
+
+    # `flask images worker` processes uploads queued by save_picture
+    IMAGE_WORKER_PROCESSES = int(os.environ.get('IMAGE_WORKER_PROCESSES', 0)) or None  # None: every core
+    IMAGE_WORKER_POLL_INTERVAL = float(os.environ.get('IMAGE_WORKER_POLL_INTERVAL', 2))
+    IMAGE_JOB_TIMEOUT = int(os.environ.get('IMAGE_JOB_TIMEOUT', 600))  # seconds before a stuck job is retried
+
+    # Animated uploads also get a silent MP4 when this ffmpeg binary is on the
+    # worker's PATH; set to an empty string to only make animated WebP
+    FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+    # `flask images gc` leaves files younger than this alone (seconds), so an
+    # upload whose row hasn't been committed yet is never collected
+    UPLOAD_GC_GRACE_PERIOD = int(os.environ.get('UPLOAD_GC_GRACE_PERIOD', 3600))
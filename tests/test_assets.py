@@ -0,0 +1,127 @@
+import unittest
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+
+# Add the app directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import url_for
+from app import create_app, db
+from app.assets import assets, precompress, minify_css, STYLE_SOURCE_DIR
+from app.models import SiteSettings
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DEBUG = False
+    SERVER_NAME = 'localhost'
+
+class AssetTestCase(unittest.TestCase):
+    config = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(SiteSettings(site_name="Eidikos Test"))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_pages_link_fingerprinted_assets(self):
+        """Test that asset URLs carry a content hash and are served as immutable."""
+        html = self.client.get('/').data.decode()
+        fingerprint = assets.fingerprint('style.css')
+        self.assertRegex(fingerprint, r'^[0-9a-f]{12}$')
+        self.assertIn(f'href="/static/style.{fingerprint}.css"', html)
+        self.assertRegex(html, r'src="/static/script\.[0-9a-f]{12}\.js"')
+
+        response = self.client.get(f'/static/style.{fingerprint}.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, 365 * 24 * 3600)
+        with open(os.path.join(self.app.static_folder, 'style.css'), 'rb') as f:
+            self.assertEqual(response.data, f.read())
+        response.close()
+
+    def test_stale_and_plain_asset_urls_are_not_immutable(self):
+        for url in ('/static/style.000000000000.css', '/static/style.css'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.cache_control.immutable)
+            response.close()
+        self.assertEqual(self.client.get('/static/missing.000000000000.css').status_code, 404)
+
+    def test_admin_stylesheet_and_uploads(self):
+        with self.app.test_request_context():
+            self.assertRegex(url_for('static', filename='css/admin_custom.css'),
+                             r'^/static/css/admin_custom\.[0-9a-f]{12}\.css$')
+            # Uploads are named after their content already, and not in the manifest
+            self.assertEqual(url_for('static', filename='uploads/gallery/a.jpg'), '/static/uploads/gallery/a.jpg')
+        self.assertFalse([name for name in assets._hashes if name.startswith('uploads/')])
+
+    def test_page_stylesheets_are_minified_bundles(self):
+        """Test that page styles are served from fingerprinted, minified bundles instead of inline."""
+        html = self.client.get('/contact').data.decode()
+        self.assertNotIn('<style>', html)
+        self.assertRegex(html, r'href="/static/bundles/core\.[0-9a-f]{12}\.css"')
+        fingerprint = assets.fingerprint('bundles/contact.css')
+        self.assertIn(f'href="/static/bundles/contact.{fingerprint}.css"', html)
+
+        response = self.client.get(f'/static/bundles/contact.{fingerprint}.css')
+        self.assertTrue(response.cache_control.immutable)
+        with open(os.path.join(STYLE_SOURCE_DIR, 'contact.css')) as f:
+            self.assertEqual(response.data.decode(), minify_css(f.read()))
+        self.assertIn(b'.contact-grid{display:flex;flex-wrap:wrap;', response.data)
+        response.close()
+
+        self.assertEqual(minify_css("/* a */ .a > b ,\n.c:hover { content: 'x /* y */' ; }"),
+                         ".a>b,.c:hover{content:'x /* y */'}")
+
+    def test_precompressed_variants_negotiated_from_accept_encoding(self):
+        static = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static)
+        shutil.copy(os.path.join(self.app.static_folder, 'style.css'), static)
+        with open(os.path.join(static, 'tiny.css'), 'w') as f:
+            f.write('a{}')
+        assets.static_folder = static
+
+        self.assertGreaterEqual(precompress(static), 1)
+        self.assertTrue(os.path.exists(os.path.join(static, 'style.css.gz')))
+        self.assertFalse(os.path.exists(os.path.join(static, 'tiny.css.gz')))
+        self.assertEqual(precompress(static), 0)
+
+        with open(os.path.join(static, 'style.css'), 'rb') as f:
+            original = f.read()
+        response = self.client.get('/static/style.css', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), original)
+        response.close()
+
+        response = self.client.get('/static/style.css', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(response.data, original)
+        response.close()
+
+        # A variant older than its file is stale and not served
+        os.utime(os.path.join(static, 'style.css.gz'), (0, 0))
+        response = self.client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        response.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
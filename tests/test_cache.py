@@ -0,0 +1,326 @@
+import unittest
+import gzip
+import os
+import sys
+import threading
+import time
+
+# Add the app directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import template_rendered
+from sqlalchemy import event, text
+from app import create_app, db
+from app.page_cache import page_cache
+from app.compression import compression
+from app.cache import SingleFlight
+from app.models import SiteSettings, ContactInfo, Sponsor, ContentVersion, Program
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DEBUG = False
+    SERVER_NAME = 'localhost'
+
+class CacheTestCase(unittest.TestCase):
+    config = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(SiteSettings(site_name="Eidikos Test"))
+        db.session.add(ContactInfo(email="test@example.com"))
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._record_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._record_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def queried(self, table):
+        return [s for s in self.statements if s.lstrip().upper().startswith('SELECT') and f'FROM {table}' in s]
+
+    def test_globals_cached_on_warm_worker(self):
+        """Test that the footer globals are only queried on the first render."""
+        self.client.get('/about')
+        self.assertTrue(self.queried('sponsor'))
+
+        self.statements.clear()
+        response = self.client.get('/about')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'test@example.com', response.data)
+        for table in ('social_media', 'contact_info', 'site_settings', 'sponsor'):
+            self.assertFalse(self.queried(table), table)
+
+    def test_globals_rebuilt_after_write(self):
+        """Test that committing a Sponsor drops the cached globals."""
+        self.client.get('/about')
+        db.session.add(Sponsor(name="Acme Learning"))
+        db.session.commit()
+
+        response = self.client.get('/about')
+        self.assertIn(b'Acme Learning', response.data)
+
+    def test_rollback_keeps_cache(self):
+        """Test that rolled back writes do not invalidate the globals."""
+        self.client.get('/about')
+        db.session.add(Sponsor(name="Never Saved"))
+        db.session.flush()
+        db.session.rollback()
+
+        self.statements.clear()
+        response = self.client.get('/about')
+        self.assertNotIn(b'Never Saved', response.data)
+        self.assertFalse(self.queried('sponsor'))
+
+    def test_commit_bumps_content_version(self):
+        """Test that content commits bump the shared version and inquiries do not."""
+        version = db.session.get(ContentVersion, 1).version
+        db.session.add(Sponsor(name="Acme Learning"))
+        db.session.commit()
+        self.assertEqual(db.session.get(ContentVersion, 1).version, version + 1)
+
+        self.client.post('/contact', data={'name': 'A', 'email': 'a@example.com'})
+        db.session.expire_all()
+        self.assertEqual(db.session.get(ContentVersion, 1).version, version + 1)
+
+    def test_page_cache_hit_and_invalidation(self):
+        """Test that anonymous pages are served from the page cache until content changes."""
+        self.assertEqual(self.client.get('/about').headers['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/about').headers['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/about?ref=x').headers['X-Cache'], 'MISS')
+
+        db.session.add(Sponsor(name="Acme Learning"))
+        db.session.commit()
+        response = self.client.get('/about')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertIn(b'Acme Learning', response.data)
+
+    def test_page_cache_replays_compressed_page(self):
+        """Test that cached pages are gzipped once, when stored, and replayed as is."""
+        identity = self.client.get('/about').data
+        page, _ = page_cache.lookup('/about?')
+        self.assertIn('gzip', page.encoded)
+        self.assertEqual(page_cache._size, len(page.body) + sum(len(b) for b in page.encoded.values()))
+
+        response = self.client.get('/about', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(response.data, page.encoded['gzip'])
+        self.assertEqual(gzip.decompress(response.data), identity)
+
+        response = self.client.get('/about', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, identity)
+
+    def test_compression_middleware(self):
+        """Test that uncached responses are compressed unless small, streamed or already encoded."""
+        self.app.add_url_rule('/_stream', '_stream', lambda: self.app.response_class(
+            iter([b'<p>streamed</p>' * 200]), mimetype='text/html'))
+        self.app.add_url_rule('/_small', '_small', lambda: '<p>small</p>' * 50)
+
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Thanks for writing')]
+        response = self.client.get('/contact', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('X-Cache', response.headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIn(b'Thanks for writing', gzip.decompress(response.data))
+
+        for url in ('/_stream', '/_small'):
+            response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertIn(b'</p>', response.data)
+
+        compression.min_size = 1
+        response = self.client.get('/_small', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+    def test_conditional_get_answers_304_before_rendering(self):
+        """Test that pages carry validators from the content version and revalidate without rendering."""
+        response = self.client.get('/about')
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertTrue(response.cache_control.no_cache)
+
+        self.statements.clear()
+        response = self.client.get('/about', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertNotIn('X-Cache', response.headers)
+        self.assertFalse(self.queried('sponsor'))
+        # Last-Modified alone works for clients that don't send ETags
+        response = self.client.get('/contact', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        # The validators are shared by every page, but only pages that exist are validated
+        for url, status in (('/program/no-such-program', 404), ('/news-impact/999', 404),
+                            ('/gallery/items?media=audio', 400)):
+            response = self.client.get(url, headers={'If-None-Match': etag, 'If-Modified-Since': last_modified})
+            self.assertEqual(response.status_code, status, url)
+            self.assertNotIn('ETag', response.headers)
+
+        # Any content commit changes the validators
+        db.session.add(Sponsor(name="Acme Learning"))
+        db.session.commit()
+        response = self.client.get('/about', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn(b'Acme Learning', response.data)
+
+        # Pages specific to one visitor aren't validated
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Thanks for writing')]
+        response = self.client.get('/contact', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    def test_conditional_get_skips_rendering_without_page_cache(self):
+        """Test that a 304 neither renders nor queries content, even with the page cache off."""
+        page_cache.enabled = False
+        db.session.add(Program(name="Spell Bee", slug="spell-bee"))
+        db.session.commit()
+        response = self.client.get('/program/spell-bee')
+        etag = response.headers['ETag']
+
+        rendered = []
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+        template_rendered.connect(record, self.app)
+        try:
+            self.statements.clear()
+            for url in ('/program/spell-bee', '/about', '/gallery?media=image', '/news-impact'):
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(rendered, [])
+            self.assertEqual([s for s in self.statements if 'content_version' not in s], [])
+
+            response = self.client.get('/program/no-such-program', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 404)
+        finally:
+            template_rendered.disconnect(record, self.app)
+
+    def test_page_cache_skips_flashed_messages(self):
+        self.client.get('/contact')
+        with self.client.session_transaction() as sess:
+            sess['_flashes'] = [('success', 'Thanks for writing')]
+        response = self.client.get('/contact')
+        self.assertNotIn('X-Cache', response.headers)
+        self.assertIn(b'Thanks for writing', response.data)
+
+    def test_page_cache_serves_stale_during_regeneration(self):
+        self.client.get('/about')
+        page, _ = page_cache.lookup('/about?')
+        page.stored_at -= page_cache.ttl + 1
+
+        # First request past the TTL claims the refresh; others get the stale copy meanwhile
+        stale, regenerate = page_cache.lookup('/about?')
+        self.assertTrue(regenerate)
+        self.assertEqual(self.client.get('/about').headers['X-Cache'], 'STALE')
+        page_cache.release('/about?')
+        self.assertEqual(self.client.get('/about').headers['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/about').headers['X-Cache'], 'HIT')
+
+    def test_page_cache_evicts_least_recently_used(self):
+        self.client.get('/about')
+        self.client.get('/join')
+        page_cache.max_bytes = len(page_cache.lookup('/about?')[0].body) + len(page_cache.lookup('/join?')[0].body)
+        self.client.get('/digital')
+        self.assertIsNone(page_cache.lookup('/about?')[0])
+        self.assertIsNotNone(page_cache.lookup('/digital?')[0])
+
+class VersionCheckConfig(TestConfig):
+    CONTENT_VERSION_CHECK_INTERVAL = 0
+
+class CrossWorkerTestCase(CacheTestCase):
+    config = VersionCheckConfig
+
+    def test_version_change_drops_local_caches(self):
+        """Test that a write committed by another worker is picked up through the version counter."""
+        self.client.get('/about')
+        # Simulate another worker: write without going through this worker's session
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO sponsor (name, \"order\") VALUES ('Other Worker Sponsor', 0)"))
+            conn.execute(text("UPDATE content_version SET version = version + 1"))
+
+        response = self.client.get('/about')
+        self.assertIn(b'Other Worker Sponsor', response.data)
+
+class SingleFlightTestCase(unittest.TestCase):
+    def run_concurrently(self, flight, fn, count=8, timeout=None):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', fn, timeout))) for _ in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_concurrent_calls_share_one_computation(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = self.run_concurrently(SingleFlight(), compute)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r for r, _ in results], ['page'] * 8)
+        self.assertEqual(sum(1 for _, shared in results if not shared), 1)
+
+    def test_waiters_fall_back_after_timeout(self):
+        calls = []
+        def compute():
+            calls.append(1)
+            time.sleep(0.3)
+            return 'page'
+
+        results = self.run_concurrently(SingleFlight(), compute, count=3, timeout=0.05)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual([r for r, _ in results], ['page'] * 3)
+
+    def test_waiters_retry_when_leader_fails(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        def failing():
+            started.set()
+            release.wait()
+            raise RuntimeError('database unavailable')
+
+        errors = []
+        def lead():
+            try:
+                flight.do('key', failing)
+            except RuntimeError as e:
+                errors.append(e)
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait()
+        waiter_result = []
+        waiter = threading.Thread(target=lambda: waiter_result.append(flight.do('key', lambda: 'fallback')))
+        waiter.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        waiter.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(waiter_result, [('fallback', False)])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,327 @@
+import unittest
+import os
+import re
+import html
+import sys
+from datetime import date
+
+# Add the app directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.content import LiveContent, get_content, decode_news_cursor, decode_gallery_cursor
+from app.models import (Page, Section, Program, ProgramSubContent, Partnership, SponsorshipTier, NewsArticle,
+                        ImpactMetric, GalleryItem, SiteSettings, ContactInfo)
+from app import models
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DEBUG = False
+    SERVER_NAME = 'localhost'
+
+class LiveConfig(TestConfig):
+    CONTENT_SNAPSHOT_ENABLED = False
+
+PUBLIC_URLS = ['/', '/about', '/programs', '/programs/spell-bee', '/digital', '/partnerships', '/join',
+               '/gallery', '/news-impact', '/news-impact/1', '/news-impact/archive/2025',
+               '/news-impact/archive/2025/1', '/contact']
+
+class ContentTestCase(unittest.TestCase):
+    config = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.seed()
+        self.client = self.app.test_client()
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self._record_statement)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._record_statement)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def seed(self):
+        db.session.add(SiteSettings(site_name="Eidikos Test"))
+        db.session.add(ContactInfo(email="test@example.com"))
+        page = Page(slug='programs', hero_title='Our Programs')
+        db.session.add(page)
+        db.session.flush()
+        db.session.add(Section(page_id=page.id, section_key='intro', content='<p>Programs intro</p>'))
+        spell = Program(name="Spell Bee", slug="spell-bee", type="competitions",
+                        category="youth_competitions", is_featured=True, order=1)
+        training = Program(name="Leadership Lab", slug="leadership-lab", type="training",
+                           category="professional_dev", description="Lab description", order=2)
+        db.session.add_all([spell, training])
+        db.session.flush()
+        db.session.add_all([
+            ProgramSubContent(program_id=training.id, title="Second", content="b", order=2),
+            ProgramSubContent(program_id=training.id, title="First", content="a", order=1),
+            GalleryItem(title="Final Round", image_filename="final.jpg", program_id=spell.id),
+        ])
+        partner = Partnership(type='corporate', title='Corporate Sponsors', benefits='Visibility\nReach')
+        db.session.add(partner)
+        db.session.flush()
+        db.session.add(SponsorshipTier(partnership_id=partner.id, tier_name='Platinum Partner'))
+        db.session.add(NewsArticle(title="Season Opens", category="Events", content="Opening day",
+                                   date_published=date(2025, 1, 10)))
+        db.session.add(models.Testimonial(author_name="Sarah", content="Great event"))
+        db.session.add(ImpactMetric(label="Schools", value="500+"))
+        db.session.commit()
+
+    def test_public_pages_render(self):
+        """Test that every public page renders from the content source."""
+        for url in PUBLIC_URLS:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+        response = self.client.get('/partnerships')
+        self.assertIn(b'Platinum Partner', response.data)
+        self.assertIn(b'Visibility', response.data)
+        response = self.client.get('/programs')
+        self.assertIn(b'Programs intro', response.data)
+        self.assertLess(response.data.index(b'First'), response.data.index(b'Second'))
+
+    def test_missing_content_returns_404(self):
+        self.assertEqual(self.client.get('/programs/unknown').status_code, 404)
+        self.assertEqual(self.client.get('/news-impact/999').status_code, 404)
+        self.assertEqual(self.client.get('/news-impact/archive/2019').status_code, 404)
+        self.assertEqual(self.client.get('/news-impact/archive/2025/13').status_code, 404)
+        self.assertEqual(self.client.get('/news-impact/more?before=yesterday').status_code, 400)
+
+    def add_news(self):
+        """Adds articles sharing dates, plus undated ones, to exercise the (date, id) ordering."""
+        for day in (3, 3, 3, 20, 20):
+            db.session.add(NewsArticle(title=f"March {day}", content="x", date_published=date(2024, 3, day)))
+        db.session.add(NewsArticle(title="February", content="x", date_published=date(2024, 2, 1)))
+        db.session.commit()
+        for _ in range(2):
+            article = NewsArticle(title="Undated", content="x")
+            db.session.add(article)
+            db.session.flush()
+            article.date_published = None
+        db.session.commit()
+
+    def test_news_pages_follow_date_then_id(self):
+        """Test that walking the cursor visits every article once, newest first, undated last."""
+        self.add_news()
+        expected = NewsArticle.query.all()
+        expected.sort(key=lambda a: (a.date_published is not None, a.date_published or date.min, a.id), reverse=True)
+
+        seen, cursor = [], None
+        with self.app.test_request_context():
+            content = get_content()
+            while True:
+                articles, next_cursor = content.news_page(cursor and decode_news_cursor(cursor), limit=3)
+                self.assertLessEqual(len(articles), 3)
+                seen += [a.id for a in articles]
+                if next_cursor is None:
+                    break
+                cursor = next_cursor
+        self.assertEqual(seen, [a.id for a in expected])
+
+    def test_load_more_fragment(self):
+        """Test that /news-impact shows one page and the fragment endpoint chains the rest."""
+        self.add_news()
+        self.app.config['NEWS_PER_PAGE'] = 4
+        response = self.client.get('/news-impact')
+        self.assertEqual(response.data.count(b'class="news-card"'), 4)
+        self.assertIn(b'id="news-load-more"', response.data)
+        self.assertIn(b'March 2024 (5)', response.data)
+
+        link = re.search(rb'href="([^"]+)"\s+data-items="([^"]+)"[^>]*id="news-load-more"', response.data)
+        fragment = self.client.get(html.unescape(link.group(2).decode()))
+        self.assertNotIn(b'<html', fragment.data)
+        self.assertEqual(fragment.data.count(b'class="news-card"'), 4)
+        last = self.client.get(fragment.headers['X-Next-Page'])
+        self.assertEqual(last.data.count(b'class="news-card"'), 1)
+        self.assertIn(b'Undated', last.data)
+        self.assertNotIn('X-Next-Page', last.headers)
+
+        # Without JavaScript the link leads to the next full page
+        next_page = self.client.get(html.unescape(link.group(1).decode()))
+        self.assertIn(b'<html', next_page.data)
+        self.assertEqual(next_page.data.count(b'class="news-card"'), 4)
+        self.assertIn(fragment.data.strip(), next_page.data)
+        self.assertEqual(self.client.get('/news-impact?before=x').status_code, 400)
+        self.assertEqual(self.client.get('/news-impact/more').status_code, 400)
+
+    def test_news_archive(self):
+        self.add_news()
+        response = self.client.get('/news-impact/archive/2024/3')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'March 2024', response.data)
+        self.assertEqual(response.data.count(b'class="news-card"'), 5)
+        self.assertEqual(self.client.get('/news-impact/archive/2024').data.count(b'class="news-card"'), 6)
+
+    def add_gallery(self):
+        """Adds photos and videos across two programs and categories, with repeated order values."""
+        spell, lab = Program.query.order_by(Program.id).all()
+        for i in range(10):
+            db.session.add(GalleryItem(title=f"Item {i}", order=i // 3, category='Awards' if i % 2 else 'Events',
+                                       program_id=spell.id if i < 6 else lab.id,
+                                       image_filename=None if i % 4 == 3 else f"{i}.jpg",
+                                       video_url="https://youtu.be/abc" if i % 4 == 3 else None))
+        db.session.commit()
+        return spell, lab
+
+    def walk_gallery(self, **filters):
+        ids, cursor = [], None
+        with self.app.test_request_context():
+            content = get_content()
+            while True:
+                items, cursor = content.gallery_page(cursor and decode_gallery_cursor(cursor), limit=3, **filters)
+                ids += [item.id for item in items]
+                if cursor is None:
+                    return ids
+
+    def test_gallery_pages_filter_server_side(self):
+        """Test that cursor pages cover exactly the filtered items in (order, id) order."""
+        spell, lab = self.add_gallery()
+        items = sorted(GalleryItem.query.all(), key=lambda i: (i.order, i.id))
+        self.assertEqual(self.walk_gallery(), [i.id for i in items])
+        self.assertEqual(self.walk_gallery(program_id=lab.id), [i.id for i in items if i.program_id == lab.id])
+        self.assertEqual(self.walk_gallery(category='Awards'), [i.id for i in items if i.category == 'Awards'])
+        self.assertEqual(self.walk_gallery(media='video'), [i.id for i in items if i.video_url])
+        self.assertEqual(self.walk_gallery(program_id=spell.id, media='image'),
+                         [i.id for i in items if i.program_id == spell.id and not i.video_url])
+        self.assertEqual(self.walk_gallery(program_id=999), [])
+
+    def test_gallery_fragment_endpoint(self):
+        """Test that /gallery renders one page and /gallery/items serves the rest as fragments."""
+        self.add_gallery()
+        self.app.config['GALLERY_PER_PAGE'] = 4
+        response = self.client.get('/gallery?media=image')
+        self.assertEqual(response.data.count(b'class="gallery-item"'), 4)
+        link = re.search(rb'href="([^"]+)" data-items="([^"]+)"', response.data)
+        fragment = self.client.get(html.unescape(link.group(2).decode()))
+        self.assertNotIn(b'<html', fragment.data)
+        self.assertEqual(fragment.data.count(b'class="gallery-item"'), 4)
+        last = self.client.get(fragment.headers['X-Next-Page'])
+        self.assertEqual(last.data.count(b'class="gallery-item"'), 1)
+        self.assertNotIn('X-Next-Page', last.headers)
+
+        # Without JavaScript the link leads to the next full page
+        next_page = self.client.get(html.unescape(link.group(1).decode()))
+        self.assertIn(b'<html', next_page.data)
+        self.assertEqual(next_page.data.count(b'class="gallery-item"'), 4)
+        self.assertIn(fragment.data.strip(), next_page.data)
+        self.assertEqual(self.client.get('/gallery?after=1').status_code, 400)
+
+        self.assertEqual(self.client.get('/gallery/items?media=audio').status_code, 400)
+        self.assertEqual(self.client.get('/gallery/items?program=abc').status_code, 400)
+        self.assertEqual(self.client.get('/gallery/items?after=1').status_code, 400)
+
+    def test_sections_follow_order_then_id(self):
+        page = Page.query.filter_by(slug='programs').first()
+        db.session.add_all([Section(page_id=page.id, section_key='closing', order=3),
+                            Section(page_id=page.id, section_key='stats', order=2)])
+        db.session.commit()
+        with self.app.test_request_context():
+            page, sections = get_content().page_data('programs')
+            self.assertEqual([s.section_key for s in page.sections_list], ['intro', 'stats', 'closing'])
+            self.assertEqual(list(sections), ['intro', 'stats', 'closing'])
+
+class SnapshotTestCase(ContentTestCase):
+    def test_snapshot_serves_without_sql(self):
+        """Test that a warm snapshot renders public pages with zero queries."""
+        for url in PUBLIC_URLS:
+            self.client.get(url)
+        self.statements.clear()
+        for url in PUBLIC_URLS:
+            self.client.get(url)
+        # Only the periodic content version check may reach the database
+        self.assertEqual([s for s in self.statements if 'content_version' not in s], [])
+
+    def test_snapshot_replaced_after_commit(self):
+        """Test that a commit swaps in a fresh snapshot."""
+        with self.app.test_request_context():
+            before = get_content()
+            self.assertIs(get_content(), before)
+        program = Program.query.filter_by(slug='spell-bee').first()
+        program.name = "Spelling Bee Finals"
+        db.session.commit()
+
+        with self.app.test_request_context():
+            after = get_content()
+        self.assertIsNot(after, before)
+        self.assertEqual(before.program_by_slug('spell-bee').name, "Spell Bee")
+        self.assertEqual(after.program_by_slug('spell-bee').name, "Spelling Bee Finals")
+
+    def test_records_are_read_only(self):
+        with self.app.test_request_context():
+            program = get_content().program_by_slug('spell-bee')
+            with self.assertRaises(AttributeError):
+                program.name = "Changed"
+            self.assertEqual(program.detail_url, '/program/spell-bee')
+            self.assertEqual(program.gallery_items_list[0].program.slug, 'spell-bee')
+
+class LiveContentTestCase(ContentTestCase):
+    config = LiveConfig
+
+    def test_relationships_order_like_the_snapshot(self):
+        """Test that the *_list relationships break ties in order by id, as the snapshot does."""
+        for relationship in (Page.sections_list, models.Section.items_list, Program.gallery_items_list,
+                             Program.subcontents_list, Partnership.tiers_list):
+            self.assertEqual([column.name for column in relationship.property.order_by], ['order', 'id'])
+
+    def test_flag_falls_back_to_live_queries(self):
+        with self.app.test_request_context():
+            self.assertIsInstance(get_content(), LiveContent)
+
+    def test_programs_listing_query_count_is_constant(self):
+        """Test that the listing loads subcontents in one query however many programs exist."""
+        for i in range(5):
+            program = Program(name=f"Program {i}", slug=f"program-{i}", category="services")
+            db.session.add(program)
+            db.session.flush()
+            db.session.add(ProgramSubContent(program_id=program.id, title="Includes", content="x"))
+        db.session.commit()
+
+        self.statements.clear()
+        response = self.client.get('/programs')
+        self.assertIn(b'PROGRAM 4', response.data)
+        self.assertEqual(len([s for s in self.statements if 'FROM program ' in s]), 1)
+        self.assertEqual(len([s for s in self.statements if 'FROM program_sub_content' in s]), 1)
+
+    def test_partnerships_load_tiers_eagerly(self):
+        """Test that partnership tiers come from one eager query rather than one per partner."""
+        for i in range(4):
+            partner = Partnership(type='corporate', title=f'Partner {i}')
+            db.session.add(partner)
+            db.session.flush()
+            db.session.add(SponsorshipTier(partnership_id=partner.id, tier_name=f'Tier {i}', order=i))
+        db.session.commit()
+
+        self.statements.clear()
+        response = self.client.get('/partnerships')
+        self.assertIn(b'Tier 3', response.data)
+        self.assertEqual(len([s for s in self.statements if 'FROM sponsorship_tier' in s]), 1)
+
+    def test_gallery_loads_programs_eagerly(self):
+        for i in range(3):
+            program = Program(name=f"Gallery Program {i}", slug=f"gallery-program-{i}")
+            db.session.add(program)
+            db.session.flush()
+            db.session.add(GalleryItem(title=f"Photo {i}", image_filename="p.jpg", program_id=program.id))
+        db.session.commit()
+        db.session.expire_all()
+
+        self.statements.clear()
+        response = self.client.get('/gallery')
+        self.assertIn(b'Gallery Program 2', response.data)
+        self.assertLessEqual(len([s for s in self.statements if 'FROM program' in s]), 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,467 @@
+import unittest
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+from io import BytesIO
+from unittest import mock
+
+# Add the app directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from app import create_app, db
+from app.images import derivative_path, image_srcset
+from app.image_cache import image_cache
+from app.image_jobs import run_jobs, work, queue_missing_images
+from app.models import (UploadedImage, ImageJob, StoredUpload, GalleryItem, Program, SiteSettings, Page, Section,
+                        Partnership, NewsArticle)
+from app.uploads import InvalidImage
+from app.utils import save_picture
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DEBUG = False
+    SERVER_NAME = 'localhost'
+
+def make_upload(filename, size=(1500, 1000), image_format='JPEG', mode='RGB'):
+    data = BytesIO()
+    Image.new(mode, size, 'red' if mode == 'RGB' else 1).save(data, image_format)
+    data.seek(0)
+    return FileStorage(stream=data, filename=filename)
+
+def png_header(width, height):
+    """A PNG that declares the given size but holds no pixel data."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return BytesIO(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', b''))
+
+class ImageTestCase(unittest.TestCase):
+    config = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.upload_dir = tempfile.mkdtemp()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        image_cache.directory = os.path.join(self.upload_dir, 'image_cache')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(SiteSettings(site_name="Eidikos Test"))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def test_save_picture_writes_derivatives(self):
+        """Test that an upload gets a resized copy for every responsive width below its own."""
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        db.session.commit()
+        run_jobs()
+
+        record = UploadedImage.query.filter_by(folder='gallery', filename=filename).one()
+        self.assertEqual((record.width, record.height), (1500, 1000))
+        self.assertEqual(record.widths_list, [320, 640, 1280])
+        for width in record.widths_list:
+            with Image.open(derivative_path('gallery', filename, width)) as derivative:
+                self.assertEqual(derivative.size, (width, round(1000 * width / 1500)))
+        self.assertFalse(os.path.exists(derivative_path('gallery', filename, 2048)))
+
+    def test_small_and_unreadable_uploads_keep_original_only(self):
+        small = save_picture(make_upload('logo.png', size=(200, 80), image_format='PNG', mode='P'), folder='sponsors')
+        svg = save_picture(FileStorage(stream=BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg"/>'),
+                                       filename='logo.svg'), folder='sponsors')
+        db.session.commit()
+        run_jobs()
+
+        self.assertEqual(UploadedImage.query.filter_by(filename=small).one().widths_list, [])
+        self.assertIsNone(UploadedImage.query.filter_by(filename=svg).first())
+        self.assertTrue(os.path.exists(os.path.join(self.upload_dir, 'sponsors', svg)))
+        with self.app.test_request_context():
+            self.assertEqual(image_srcset('sponsors', small), f'/images/sponsors/{small} 200w')
+            self.assertEqual(image_srcset('sponsors', svg), '')
+
+    def test_templates_emit_srcset_once_processed(self):
+        """Test that pages use the original until the worker has processed the upload."""
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        db.session.add(GalleryItem(title="Stage", image_filename=filename))
+        db.session.commit()
+
+        response = self.client.get('/gallery')
+        self.assertIn(f'src="/static/uploads/gallery/{filename}"'.encode(), response.data)
+        self.assertIn(b'width="1500" height="1000" loading="lazy"', response.data)
+        self.assertNotIn(b'/images/gallery/derived/', response.data)
+        self.assertNotIn(b'data:image/jpeg', response.data)
+
+        run_jobs()
+        response = self.client.get('/gallery')
+        stem = filename.rsplit('.', 1)[0]
+        self.assertIn(f'/images/gallery/derived/{stem}-320w.jpg 320w'.encode(), response.data)
+        self.assertIn(f'/images/gallery/{filename} 1500w'.encode(), response.data)
+        self.assertIn(b'sizes="(max-width: 768px) 100vw, 33vw"', response.data)
+        # Pure red, quantized
+        self.assertRegex(response.data, rb'style="background: #f[ef]0000 url\(data:image/jpeg;base64,[^)]+\) center / cover')
+
+    def test_sized_images_keep_their_aspect_ratio(self):
+        """Test that images whose CSS sets one dimension let the other one follow the aspect ratio."""
+        def img_tag(html, folder, filename):
+            start = html.index(f'src="/static/uploads/{folder}/{filename}"')
+            return html[start:html.index('>', start)]
+
+        logo = save_picture(make_upload('logo.jpg'), folder='partners')
+        intro = save_picture(make_upload('intro.jpg', size=(1200, 900)), folder='sections')
+        story = save_picture(make_upload('story.jpg', size=(1000, 700)), folder='news')
+        page = Page(slug='about')
+        db.session.add(page)
+        db.session.flush()
+        db.session.add(Section(page_id=page.id, section_key='intro', title="Intro", image_filename=intro))
+        db.session.add(Partnership(type='schools', title="Schools", image_filename=logo))
+        db.session.add(NewsArticle(title="Current", content="<p>Now</p>", category="News"))
+        db.session.add(NewsArticle(title="Related", content="<p>Then</p>", category="News", image_filename=story))
+        db.session.commit()
+        current = NewsArticle.query.filter_by(title="Current").one()
+
+        tag = img_tag(self.client.get('/partnerships').data.decode(), 'partners', logo)
+        self.assertIn('width="1500" height="1000"', tag)
+        self.assertIn('height: 30px; width: auto;', tag)
+        tag = img_tag(self.client.get('/about').data.decode(), 'sections', intro)
+        self.assertIn('width: 100%; height: auto;', tag)
+        html = self.client.get(f'/news-impact/{current.id}').data.decode()
+        self.assertIn('class="card-img-top"', img_tag(html, 'news', story))
+        with open(os.path.join(self.app.static_folder, 'bundles', 'news-detail.css')) as f:
+            self.assertIn('.story-card .card-img-top{width:100%;object-fit:cover}', f.read())
+
+    def test_placeholders_skip_transparent_images(self):
+        filename = save_picture(make_upload('logo.png', size=(400, 300), image_format='PNG', mode='RGBA'),
+                                folder='sponsors')
+        db.session.commit()
+        run_jobs()
+        record = UploadedImage.query.filter_by(filename=filename).one()
+        self.assertEqual((record.width, record.height, record.color, record.placeholder), (400, 300, None, None))
+
+    def test_identical_uploads_are_stored_once(self):
+        """Test that re-uploading the same image reuses the stored file and its processing."""
+        first = save_picture(make_upload('stage.jpg'), folder='gallery')
+        db.session.commit()
+        second = save_picture(make_upload('Stage-copy.JPG'), folder='gallery')
+        db.session.commit()
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^[0-9a-f]{32}\.jpg$')
+        self.assertEqual(os.listdir(os.path.join(self.upload_dir, 'gallery')), [first])
+        self.assertEqual(ImageJob.query.count(), 1)
+        self.assertNotEqual(save_picture(make_upload('other.jpg', size=(900, 600)), folder='gallery'), first)
+
+    def test_reference_counts_follow_image_columns(self):
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        other = save_picture(make_upload('other.jpg', size=(900, 600)), folder='gallery')
+        items = [GalleryItem(title=f"Stage {i}", image_filename=filename) for i in range(2)]
+        db.session.add_all(items)
+        db.session.commit()
+
+        def ref_count(name):
+            return StoredUpload.query.filter_by(folder='gallery', filename=name).one().ref_count
+
+        self.assertEqual((ref_count(filename), ref_count(other)), (2, 0))
+        items[0].image_filename = other
+        db.session.commit()
+        self.assertEqual((ref_count(filename), ref_count(other)), (1, 1))
+        db.session.delete(items[1])
+        db.session.commit()
+        self.assertEqual((ref_count(filename), ref_count(other)), (0, 1))
+
+        items[0].image_filename = filename
+        db.session.rollback()
+        self.assertEqual((ref_count(filename), ref_count(other)), (0, 1))
+
+    def test_gc_removes_unreferenced_uploads_and_derivatives(self):
+        kept = save_picture(make_upload('kept.jpg'), folder='gallery')
+        dropped = save_picture(make_upload('dropped.jpg', size=(900, 600)), folder='gallery')
+        item = GalleryItem(title="Stage", image_filename=dropped)
+        db.session.add_all([item, GalleryItem(title="Kept", image_filename=kept)])
+        db.session.commit()
+        run_jobs()
+        self.client.get(f'/img/320x0/gallery/{kept}').close()
+        item.image_filename = None
+        db.session.commit()
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['images', 'gc'])
+        self.assertIn('Found 0 unreferenced file(s)', result.output)
+
+        stem = dropped.rsplit('.', 1)[0]
+        result = runner.invoke(args=['images', 'gc', '--grace', '0'])
+        self.assertIn(f'gallery/{dropped}', result.output)
+        self.assertIn(f'gallery/derived/{stem}-640w.jpg', result.output)
+        self.assertNotIn(kept.rsplit('.', 1)[0], result.output)
+        self.assertTrue(os.path.exists(os.path.join(self.upload_dir, 'gallery', dropped)))
+
+        result = runner.invoke(args=['images', 'gc', '--grace', '0', '--delete'])
+        self.assertIn('Removed', result.output)
+        remaining = []
+        for dirpath, _, names in os.walk(self.upload_dir):
+            remaining += names
+        self.assertFalse([name for name in remaining if name.startswith(stem)])
+        self.assertIn(kept, remaining)
+        self.assertTrue(os.path.exists(derivative_path('gallery', kept, 640)))
+        self.assertTrue(os.path.exists(image_cache.path(f'gallery/320x0/{kept}')))
+        self.assertIsNone(UploadedImage.query.filter_by(filename=dropped).first())
+        self.assertIsNone(StoredUpload.query.filter_by(filename=dropped).first())
+
+    def test_animated_gif_transcoded_to_animated_webp(self):
+        """Test that animations get an animated WebP served to browsers that accept it, the GIF to others."""
+        frames = [Image.new('RGB', (600, 400), (i * 50, 0, 255 - i * 50)) for i in range(5)]
+        data = BytesIO()
+        frames[0].save(data, 'GIF', save_all=True, append_images=frames[1:], duration=[100, 200] * 2 + [100], loop=0)
+        data.seek(0)
+        self.app.config['FFMPEG_BINARY'] = 'no-such-ffmpeg'
+        filename = save_picture(FileStorage(stream=data, filename='dance.gif'), folder='gallery')
+        db.session.add(GalleryItem(title="Dance", image_filename=filename))
+        db.session.commit()
+        run_jobs()
+
+        record = UploadedImage.query.filter_by(filename=filename).one()
+        self.assertEqual((record.width, record.widths_list, record.video), (600, [], False))
+        response = self.client.get(f'/images/gallery/{filename}', headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        webp = Image.open(BytesIO(response.data))
+        self.assertEqual((webp.n_frames, webp.size), (5, (600, 400)))
+        self.assertLess(len(response.data), os.path.getsize(os.path.join(self.upload_dir, 'gallery', filename)))
+        response.close()
+        response = self.client.get(f'/images/gallery/{filename}', headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'image/gif')
+        response.close()
+        self.assertNotIn(b'<video', self.client.get('/gallery').data)
+
+        # Resizing would keep the first frame only, so /img sends the animation unresized
+        response = self.client.get(f'/img/320x0/gallery/{filename}', headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        self.assertEqual(Image.open(BytesIO(response.data)).n_frames, 5)
+        response.close()
+        response = self.client.get(f'/img/300x300/gallery/{filename}')
+        self.assertEqual(Image.open(BytesIO(response.data)).size, (600, 400))
+        response.close()
+
+    def test_bulk_gallery_upload_from_files_and_zip(self):
+        program = Program(name="Summit", slug="summit")
+        db.session.add(program)
+        db.session.commit()
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(3):
+                zf.writestr(f'event/photo{i}.jpg', make_upload('x.jpg', size=(800 + i, 600)).stream.read())
+            zf.writestr('event/notes.txt', 'not an image')
+            zf.writestr('__MACOSX/event/._photo0.jpg', 'resource fork')
+        archive.seek(0)
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+
+        response = self.client.post('/admin/gallery/bulk', headers={'X-Requested-With': 'XMLHttpRequest'}, data={
+            'files': [make_upload('a.jpg', size=(700, 500)), make_upload('b.png', size=(700, 500), image_format='PNG')],
+            'archive': (archive, 'event.zip'),
+            'category': 'Awards', 'program_id': program.id, 'order': 3,
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['created'], 5)
+        items = GalleryItem.query.all()
+        self.assertEqual({(i.category, i.program_id, i.order) for i in items}, {('Awards', program.id, 3)})
+        self.assertEqual(ImageJob.query.count(), 5)
+
+        self.assertEqual(self.client.get(response.json['status']).json['pending'], 5)
+        run_jobs()
+        self.assertEqual(self.client.get(response.json['status']).json,
+                         {'total': 5, 'pending': 0, 'done': 5, 'failed': 0, 'skipped': 0})
+
+        # Files stored before have no new jobs, and older jobs aren't counted with the new ones
+        response = self.client.post('/admin/gallery/bulk', headers={'X-Requested-With': 'XMLHttpRequest'}, data={
+            'files': [make_upload('a.jpg', size=(700, 500)), make_upload('c.jpg', size=(701, 500))],
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.json['created'], 2)
+        self.assertEqual(self.client.get(response.json['status']).json['total'], 1)
+        response = self.client.post('/admin/gallery/bulk', headers={'X-Requested-With': 'XMLHttpRequest'}, data={
+            'files': [make_upload('a.jpg', size=(700, 500))],
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.json['created'], 1)
+        self.assertIsNone(response.json['status'])
+        self.assertEqual(self.client.get('/admin/images/jobs?ids=1,x').status_code, 400)
+
+        response = self.client.post('/admin/gallery/bulk', data={'archive': (BytesIO(b'not a zip'), 'broken.zip')},
+                                    content_type='multipart/form-data')
+        self.assertIn(b'The ZIP archive could not be read.', response.data)
+        self.assertEqual(GalleryItem.query.count(), 8)
+
+    def test_upload_header_checked_before_anything_is_written(self):
+        """Test that bombs and mislabelled files are rejected from their header."""
+        cases = [
+            (png_header(40000, 40000), 'bomb.png', 'at most 12000 pixels per side'),
+            (png_header(9000, 9000), 'wide.png', '50 megapixels'),
+            (make_upload('photo.jpg', image_format='PNG').stream, 'photo.jpg', 'not a valid JPG image'),
+            (BytesIO(b'<html><script>alert(1)</script>'), 'logo.svg', 'not an SVG image'),
+        ]
+        for stream, filename, message in cases:
+            with self.assertRaisesRegex(InvalidImage, message):
+                save_picture(FileStorage(stream=stream, filename=filename), folder='gallery')
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, 'gallery')))
+
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('bomb.png', png_header(40000, 40000).getvalue())
+            zf.writestr('photo.jpg', make_upload('photo.jpg').stream.read())
+        archive.seek(0)
+        response = self.client.post('/admin/gallery/bulk', headers={'X-Requested-With': 'XMLHttpRequest'},
+                                    data={'archive': (archive, 'event.zip')}, content_type='multipart/form-data')
+        self.assertEqual((response.json['created'], len(response.json['rejected'])), (1, 1))
+        response = self.client.post('/admin/gallery/bulk', headers={'X-Requested-With': 'XMLHttpRequest'},
+                                    data={'files': [(png_header(40000, 40000), 'bomb.png')]},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 12000 pixels', response.json['error'])
+
+    def test_failed_jobs_are_retried_then_given_up(self):
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        db.session.commit()
+        with open(os.path.join(self.upload_dir, 'gallery', filename), 'r+b') as f:
+            f.truncate(100)
+
+        for attempt in range(3):
+            self.assertEqual(run_jobs(), 1)
+        self.assertEqual(run_jobs(), 0)
+        job = ImageJob.query.one()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIsNone(UploadedImage.query.one().placeholder)
+
+    def test_pixel_limit_applies_to_stored_uploads(self):
+        """Test that uploads over IMAGE_MAX_PIXELS from before the header check are left undecoded."""
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        db.session.commit()
+        self.app.config['IMAGE_MAX_PIXELS'] = 1000000
+        pillow_limit = Image.MAX_IMAGE_PIXELS
+
+        run_jobs()
+        self.assertEqual(ImageJob.query.one().status, 'skipped')
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, pillow_limit)
+        self.assertFalse(os.path.exists(derivative_path('gallery', filename, 640)))
+
+        response = self.client.get(f'/img/320x0/gallery/{filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Image.open(BytesIO(response.data)).size, (1500, 1000))
+        response.close()
+        self.assertIsNone(image_cache.get(f'gallery/320x0/{filename}'))
+
+    def test_worker_processes_queue_in_process_pool(self):
+        filenames = [save_picture(make_upload(f'photo{i}.jpg', size=(1400 + i, 900)), folder='gallery') for i in range(3)]
+        db.session.add(GalleryItem(title="Old upload", image_filename='legacy.jpg'))
+        db.session.commit()
+        make_upload('legacy.jpg').save(os.path.join(self.upload_dir, 'gallery', 'legacy.jpg'))
+        self.assertEqual(queue_missing_images(), 1)
+        self.assertEqual(queue_missing_images(), 0)
+
+        work(processes=2, once=True)
+        self.assertEqual({job.status for job in ImageJob.query}, {'done'})
+        self.assertEqual(UploadedImage.query.count(), 4)
+        for filename in filenames:
+            self.assertTrue(os.path.exists(derivative_path('gallery', filename, 1280)))
+
+    def test_modern_formats_negotiated_from_accept(self):
+        """Test that browsers listing AVIF/WebP get them, and everyone else the original format."""
+        filename = save_picture(make_upload('stage.png', image_format='PNG'), folder='programs')
+        db.session.commit()
+        run_jobs()
+        stem = filename.rsplit('.', 1)[0]
+        url = f'/images/programs/derived/{stem}-640w.png'
+
+        response = self.client.get(url, headers={'Accept': 'image/avif,image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/avif')
+        self.assertIn('Accept', response.headers['Vary'])
+        response.close()
+        response = self.client.get(url, headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        self.assertEqual(Image.open(BytesIO(response.data)).size, (640, 427))
+        response.close()
+        response = self.client.get(url, headers={'Accept': '*/*'})
+        self.assertEqual(response.mimetype, 'image/png')
+        response.close()
+        response = self.client.get(f'/images/programs/{filename}', headers={'Accept': 'image/webp'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        response.close()
+        self.assertEqual(self.client.get(f'/images/private/{filename}').status_code, 404)
+
+    def test_fallback_cached_briefly_until_modern_formats_exist(self):
+        """Test that the original served while its AVIF/WebP copies are being made isn't cached for good."""
+        filename = save_picture(make_upload('stage.png', image_format='PNG'), folder='programs')
+        db.session.commit()
+        response = self.client.get(f'/images/programs/{filename}', headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=300')
+        response.close()
+        response = self.client.get(f'/images/programs/{filename}', headers={'Accept': '*/*'})
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
+
+        run_jobs()
+        response = self.client.get(f'/images/programs/{filename}', headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
+
+    def test_resize_endpoint_serves_from_disk_cache(self):
+        """Test that /img resizes on the first request and serves later ones from the disk cache."""
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        response = self.client.get(f'/img/400x300/gallery/{filename}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(response.data)).size, (400, 300))
+        response.close()
+
+        # Replace the cached copy with a marker to see that the next hit doesn't resize again
+        Image.new('RGB', (10, 10)).save(image_cache.path(f'gallery/400x300/{filename}'), 'JPEG')
+        response = self.client.get(f'/img/400x300/gallery/{filename}')
+        self.assertEqual(Image.open(BytesIO(response.data)).size, (10, 10))
+        response.close()
+
+        response = self.client.get(f'/img/400x300/gallery/{filename}', headers={'Accept': 'image/webp,*/*'})
+        self.assertEqual(response.mimetype, 'image/webp')
+        response.close()
+
+    def test_resize_endpoint_rejects_unlisted_requests(self):
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        self.assertEqual(self.client.get(f'/img/401x300/gallery/{filename}').status_code, 404)
+        self.assertEqual(self.client.get(f'/img/320x0/private/{filename}').status_code, 404)
+        self.assertEqual(self.client.get('/img/320x0/gallery/missing.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/img/320x0/gallery/..%2Fapp.db').status_code, 404)
+
+    def test_resize_endpoint_refuses_decompression_bombs(self):
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100000):
+            self.assertEqual(self.client.get(f'/img/320x0/gallery/{filename}').status_code, 404)
+        self.assertIsNone(image_cache.get(f'gallery/320x0/{filename}'))
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        filename = save_picture(make_upload('stage.jpg'), folder='gallery')
+        for size in ('320x0', '640x0'):
+            self.client.get(f'/img/{size}/gallery/{filename}').close()
+        first = image_cache.path(f'gallery/320x0/{filename}')
+        second = image_cache.path(f'gallery/640x0/{filename}')
+        os.utime(first, (0, 0))
+        image_cache.max_bytes = os.path.getsize(first) + os.path.getsize(second)
+
+        self.client.get(f'/img/150x150/gallery/{filename}').close()
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(image_cache.path(f'gallery/150x150/{filename}')))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
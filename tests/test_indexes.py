@@ -0,0 +1,100 @@
+import unittest
+import os
+import sys
+
+# Add the app directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datetime import date
+from sqlalchemy import text, or_
+from app import create_app, db
+from app.models import Program, GalleryItem, NewsArticle, Section, Inquiry, Sponsor
+from config import Config
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    DEBUG = False
+    SERVER_NAME = 'localhost'
+
+class IndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def query_plan(self, query):
+        """Returns SQLite's EXPLAIN QUERY PLAN output for an ORM query as one string."""
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+        return '\n'.join(row[-1] for row in rows)
+
+    def assertUsesIndex(self, query, index_name):
+        plan = self.query_plan(query)
+        self.assertIn(index_name, plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_featured_programs(self):
+        query = Program.query.filter_by(is_featured=True).order_by(Program.order.asc())
+        self.assertUsesIndex(query, 'ix_program_is_featured_order')
+
+    def test_programs_listing(self):
+        self.assertUsesIndex(Program.query.order_by(Program.order.asc()), 'ix_program_order')
+
+    def test_related_programs(self):
+        query = Program.query.filter(Program.type == 'competitions', Program.id != 1).limit(3)
+        self.assertIn('ix_program_type', self.query_plan(query))
+
+    def test_program_gallery(self):
+        query = GalleryItem.query.filter_by(program_id=1).order_by(GalleryItem.order.asc())
+        self.assertUsesIndex(query, 'ix_gallery_item_program_id_order')
+
+    def test_gallery_listing(self):
+        self.assertUsesIndex(GalleryItem.query.order_by(GalleryItem.order.asc()).limit(6), 'ix_gallery_item_order')
+
+    def test_gallery_by_category(self):
+        query = GalleryItem.query.filter_by(category='Awards').order_by(GalleryItem.order.asc(), GalleryItem.id.asc())
+        self.assertUsesIndex(query, 'ix_gallery_item_category_order')
+
+    def test_news_by_date(self):
+        query = NewsArticle.query.order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc())
+        self.assertUsesIndex(query, 'ix_news_article_date_published_id')
+
+    def test_news_next_page(self):
+        query = NewsArticle.query.filter(NewsArticle.date_published <= date(2024, 3, 1), or_(
+            NewsArticle.date_published < date(2024, 3, 1), NewsArticle.id < 10
+        )).order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc()).limit(10)
+        self.assertUsesIndex(query, 'ix_news_article_date_published_id (date_published<?)')
+
+    def test_news_archive(self):
+        query = NewsArticle.query.filter(NewsArticle.date_published >= date(2024, 3, 1),
+                                         NewsArticle.date_published < date(2024, 4, 1)) \
+            .order_by(NewsArticle.date_published.desc(), NewsArticle.id.desc())
+        self.assertUsesIndex(query, 'ix_news_article_date_published_id (date_published>? AND date_published<?)')
+
+    def test_news_by_category(self):
+        self.assertIn('ix_news_article_category', self.query_plan(NewsArticle.query.filter_by(category='Awards')))
+
+    def test_page_sections(self):
+        query = Section.query.filter_by(page_id=1, section_key='intro')
+        self.assertIn('ix_section_page_id_section_key', self.query_plan(query))
+
+    def test_new_inquiries(self):
+        query = Inquiry.query.filter_by(status='New').order_by(Inquiry.created_at.desc())
+        self.assertUsesIndex(query, 'ix_inquiry_status_created_at')
+
+    def test_inquiry_listing(self):
+        self.assertUsesIndex(Inquiry.query.order_by(Inquiry.created_at.desc()), 'ix_inquiry_created_at')
+
+    def test_sponsor_ticker(self):
+        self.assertUsesIndex(Sponsor.query.order_by(Sponsor.order), 'ix_sponsor_order')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)